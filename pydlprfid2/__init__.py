@@ -1,17 +1,33 @@
+import os
 import sys
+import signal
 import getopt
-import serial
 import logging
 from .pydlprfid2 import PyDlpRfid2, ISO14443A, ISO14443B, ISO15693
+from .pydlprfid2 import VERIFY_BLOCK, VERIFY_DEFERRED, VERIFY_NONE, VERIFY_POLICIES
 from .crc import CRC
 
-import pkg_resources  # part of setuptools
-__version__ = pkg_resources.require('pydlprfid2')[0].version
+def package_version():
+    try:
+        from importlib.metadata import version
+    except ImportError:  # python 3.7
+        import pkg_resources  # part of setuptools
+        return pkg_resources.require('pydlprfid2')[0].version
+    return version('pydlprfid2')
+
+def __getattr__(name):
+    # __version__ is looked up on first access only, it is slow
+    global __version__
+    if name == "__version__":
+        __version__ = package_version()
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def usages():
     """ print usages """
     print("Usages:")
     print("pdr2 [options]")
+    print("pdr2 bench [options]     run the benchmarks, see pdr2 bench -h")
     print("-h, --help               print this help")
     print("-v, --verbose            print more messages")
     print("-d, --devtty=filename    uart dev name path")
@@ -29,15 +45,36 @@ def usages():
     print("-t, --test               launch debug test code")
     print("-w, --writesingle=OFFSET:DATA")
     print("                         write data in one block")
+    print("-D, --dump=FILE          dump the whole eeprom to a binary file")
+    print("-R, --restore=FILE       write a binary file to the eeprom")
+    print("-P, --provision=FILE     write a binary file to the eeprom of every tag")
+    print("                         in the field")
+    print("--verify=POLICY          write verification for -M, -R and -P:")
+    print("                         block (default), deferred or none")
+    print("--delta                  with -M, only write the blocks that differ")
+    print("--trace=FILE             record the serial traffic to FILE")
+    print("--replay=FILE            play a recorded trace back instead of a devtty")
+    print("--daemon                 keep the reader open and serve the commands")
+    print("                         of other pdr2 on a unix socket")
+    print("-S, --socket=PATH        daemon socket path. Without devtty, -l, -r, -m,")
+    print("                         -M, -w and -g go through the daemon listening")
+    print("                         there ($XDG_RUNTIME_DIR/pdr2.sock by default)")
 
 def main(argv):
+    if argv and argv[0] == "bench":
+        from .bench import launchmain
+        launchmain(argv[1:])
+        return
+
     try:
-        opts, args = getopt.getopt(argv, "hd:p:lu:r:m:M:vgw:ti",
+        opts, args = getopt.getopt(argv, "hd:p:lu:r:m:M:vgw:tiD:R:P:S:",
                   ["help", "devtty=", "protocol=",
                    "listtag", "uid=", "read=",
                    "verbose", "readmultiple=",
                    "writemultiple=", "test", "internal",
-                   "getsysinfo", "writesingle="])
+                   "getsysinfo", "writesingle=",
+                   "dump=", "restore=", "provision=", "verify=", "delta",
+                   "trace=", "replay=", "daemon", "socket="])
     except getopt.GetoptError:
         usages()
         sys.exit(2)
@@ -55,6 +92,15 @@ def main(argv):
     writedata = None
     debugtest = False
     internal = False
+    dumpfile = None
+    restorefile = None
+    provisionfile = None
+    verify = VERIFY_BLOCK
+    delta = False
+    tracefile = None
+    replayfile = None
+    daemon = False
+    socketpath = None
     for opt, arg in opts:
         if opt in ["-h", "--help"]:
             usages()
@@ -95,18 +141,75 @@ def main(argv):
             writedata = strdata
         elif opt in ("-t", "--test"):
             debugtest = True
+        elif opt in ("-D", "--dump"):
+            dumpfile = arg
+        elif opt in ("-R", "--restore"):
+            restorefile = arg
+        elif opt in ("-P", "--provision"):
+            provisionfile = arg
+        elif opt == "--verify":
+            if arg not in VERIFY_POLICIES:
+                print(f"Wrong verify policy {arg}")
+                usages()
+                sys.exit(2)
+            verify = arg
+        elif opt == "--delta":
+            delta = True
+        elif opt == "--trace":
+            tracefile = arg
+        elif opt == "--replay":
+            replayfile = arg
+        elif opt == "--daemon":
+            daemon = True
+        elif opt in ("-S", "--socket"):
+            socketpath = arg
+
+    client = None
+    if devtty is None and replayfile is None and not daemon:
+        from .daemon import DaemonClient, default_socket_path
+        if socketpath is None:
+            socketpath = default_socket_path()
+        if os.path.exists(socketpath):
+            if (debugtest or dumpfile is not None or restorefile is not None
+                    or provisionfile is not None):
+                print("-t, -D, -R and -P need a devtty")
+                sys.exit(2)
+            # The daemon reader is set up by the pdr2 --daemon command line
+            if any(opt in ("-p", "--protocol", "-i", "--internal", "-v", "--verbose",
+                           "--trace") for opt, arg in opts):
+                print("-p, -i, -v and --trace need a devtty, give them to pdr2 --daemon")
+                sys.exit(2)
+            try:
+                client = DaemonClient(socketpath)
+            except OSError as err:
+                print(f"Failed to connect to the daemon on {socketpath}: {err}")
+                sys.exit(1)
 
-    if devtty is None:
+    if devtty is None and replayfile is None and client is None:
         print("Wrong parameter: Give a devtty path")
         usages()
         sys.exit(2)
 
+    if client is not None:
+        run_commands(client, listtag, uid, dumpfile, restorefile, verify, getsysinfo,
+                     writeoffset, writedata, blockoffset, blocknum, dataliststr, delta)
+        client.close()
+        return
+
     print("Initilize the DLP")
+    import serial
     try:
-        reader = PyDlpRfid2(serial_port=devtty, loglevel=loglevel)
+        if replayfile is not None:
+            from .trace import ReplaySerial
+            reader = PyDlpRfid2(serial_port=None, loglevel=loglevel,
+                                transport=ReplaySerial(replayfile))
+        else:
+            reader = PyDlpRfid2(serial_port=devtty, loglevel=loglevel)
     except serial.serialutil.SerialException:
         print(f"Failed to open serial port {devtty}")
         sys.exit(1)
+    if tracefile is not None:
+        reader.start_trace(tracefile)
 
     if loglevel == logging.DEBUG: # get version only in debug messages level
         reader.get_dlp_rfid2_firmware_version()
@@ -120,19 +223,69 @@ def main(argv):
     if internal:
         reader.enable_internal_antenna()
 
+    if daemon:
+        serve(reader, socketpath)
+    elif provisionfile is not None:
+        run_provision(reader, provisionfile, verify)
+    else:
+        run_commands(reader, listtag, uid, dumpfile, restorefile, verify, getsysinfo,
+                     writeoffset, writedata, blockoffset, blocknum, dataliststr, delta)
+    reader.close()
+
+def serve(reader, socketpath):
+    """ Serve reader commands on the daemon socket until interrupted """
+    from .daemon import ReaderDaemon
+    server = ReaderDaemon(reader, socketpath)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Listening on {server.path}")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+
+def run_provision(reader, provisionfile, verify):
+    """ Write the image of provisionfile to every tag in the field """
+    with open(provisionfile, "rb") as fileobj:
+        image = fileobj.read()
+    print("Looking for tags")
+    report = reader.provision(image, verify=verify)
+    if len(report) == 0:
+        print("No tags found")
+        return
+    for result in report:
+        if result.ok:
+            status = "verified" if result.verified else "written"
+        else:
+            status = f"failed: {result.error}"
+        print(f"UID: {result.uid} {status}")
+    print(f"{len(report.succeeded)}/{len(report)} tags provisioned with {provisionfile} "
+          f"in {report.elapsed:.3f}s ({report.tags_per_minute:.1f} tags/min)")
+    if report.failed:
+        sys.exit(1)
+
+def run_commands(reader, listtag, uid, dumpfile, restorefile, verify, getsysinfo,
+                 writeoffset, writedata, blockoffset, blocknum, dataliststr, delta):
+    """ Run the command given on the command line on a reader or a daemon client """
     if listtag:
         print("Looking for tags")
-        ret = reader.inventory(single_slot=True)
-        if ret is not None:
-            uids = list([ret])
-        else:
-            uids = []
-        if len(uids) == 0:
+        report = reader.inventory_all()
+        if len(report) == 0:
             print("No tags found")
         else:
-            print(f"{len(uids)} tags found")
-            for uid, rssi in uids:
+            print(f"{len(report)} tags found")
+            for uid, rssi in report:
                 print(f"UID: {uid} RSSI: {rssi}")
+        print(f"{report.rounds} inventory rounds in {report.elapsed:.3f}s")
+    elif dumpfile is not None:
+        with open(dumpfile, "wb") as fileobj:
+            report = reader.eeprom_dump(uid, fileobj)
+        print(f"{report.size} bytes dumped to {dumpfile} ({report.rate:.0f} bytes/s)")
+    elif restorefile is not None:
+        with open(restorefile, "rb") as fileobj:
+            report = reader.eeprom_restore(uid, fileobj, verify=verify)
+        print(f"{report.size} bytes restored from {restorefile} ({report.rate:.0f} bytes/s)")
     elif getsysinfo:
         values = reader.eeprom_get_system_info(uid)
         print(values)
@@ -148,6 +301,10 @@ def main(argv):
             print(f"Block 0x{blockoffset:04X} to 0x{(blockoffset+(blocknum-1)):04X} : {values}")
     elif blockoffset is not None and dataliststr is not None:
         datalist = [int(vstr, 16) for vstr in dataliststr]
-        value = reader.eeprom_write_multiple_block(uid, blockoffset, datalist)
-        print(f"Block 0x{blockoffset:04X} to 0x{(blockoffset+(blocknum-1)):04X} written")
-
+        if delta:
+            report = reader.eeprom_write_delta(uid, blockoffset, datalist, verify=verify)
+            print(f"Block 0x{blockoffset:04X} to 0x{(blockoffset+(blocknum-1)):04X} written: "
+                  f"{len(report.written)} changed, {len(report.skipped)} unchanged")
+        else:
+            value = reader.eeprom_write_multiple_block(uid, blockoffset, datalist, verify=verify)
+            print(f"Block 0x{blockoffset:04X} to 0x{(blockoffset+(blocknum-1)):04X} written")
@@ -0,0 +1,297 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# asyncio driver for the DLP-RFID2
+#
+# The serial port is opened non blocking and its file descriptor is watched
+# with loop.add_reader(), so no thread is involved. Commands are serialized
+# by a lock, every call accepts a timeout and can be cancelled. Replies are
+# parsed and failures classified as PyDlpRfid2 does.
+#
+# Any tty works, including a pseudo-terminal slave on Linux:
+#
+#   async with AsyncPyDlpRfid2('/dev/ttyUSB0') as reader:
+#       await reader.set_protocol()
+#       uid, rssi = await reader.inventory(single_slot=True)
+#       data = await reader.eeprom_read_multiple_block(uid, 4, 0, timeout=0.5)
+
+import time
+import asyncio
+import logging
+
+from .pydlprfid2 import (PyDlpRfid2, ResponseParser, StandardError, NoResponseError,
+                         ReaderTimeoutError, ISO15693, ISO14443A, DLP_CMD, NTAG5_CMD,
+                         build_frame, build_request, reply_end, flagsbyte, ChipState,
+                         uid_data, block_payload, write_block_data, inventory_uids,
+                         response_payloads, parse_tag_answer)
+
+
+class AsyncPyDlpRfid2(object):
+    QUIET_TIME = PyDlpRfid2.QUIET_TIME
+    READ_TIMEOUT = PyDlpRfid2.READ_TIMEOUT
+
+    def __init__(self, serial_port, loglevel=logging.INFO):
+        self.protocol = None
+        self.chip = ChipState()
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(loglevel)
+        import serial
+        self.sp = serial.Serial(port=serial_port,
+                                baudrate=PyDlpRfid2.BAUDRATE,
+                                stopbits=PyDlpRfid2.STOP_BITS,
+                                parity=PyDlpRfid2.PARITY,
+                                bytesize=PyDlpRfid2.BYTESIZE,
+                                timeout=0)
+        self.sp.reset_input_buffer()
+        self._loop = None
+        self._lock = asyncio.Lock()
+        self._rxrest = b''
+        self._parser = None
+        self._future = None
+        self._quiet = None
+        self._stale = False
+        self.timed_out = False
+
+    def _attach(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self.sp.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        data = self.sp.read(self.sp.in_waiting or 1)
+        if not data:
+            return
+        parser = self._parser
+        if parser is None:
+            # Nobody waits: keep it for the next reply unless it is the end
+            # of a cancelled one.
+            if not self._stale:
+                self._rxrest += data
+            return
+        self._feed(parser, data)
+
+    def _feed(self, parser, data):
+        self._rxrest = parser.feed(data)
+        if self._quiet is not None:
+            self._quiet.cancel()
+            self._quiet = None
+        if parser.done:
+            self._finish()
+        elif parser.quiet_end:
+            self._quiet = self._loop.call_later(self.QUIET_TIME, self._finish)
+
+    def _finish(self):
+        self._quiet = None
+        if self._future is not None and not self._future.done():
+            self._future.set_result(None)
+
+    async def issue_evm_command(self, cmd, prms='', get_full_response=False,
+                                expect=None, timeout=None):
+        return await self.issue_frame(build_frame(cmd, prms), get_full_response, expect,
+                                      timeout)
+
+    async def issue_frame(self, frame, get_full_response=False, expect=None, timeout=None):
+        """ Send a frame from build_frame() and wait for its reply
+
+        Without timeout the reply is returned as received after READ_TIMEOUT,
+        with timed_out set, like PyDlpRfid2 does. With a timeout
+        ReaderTimeoutError is raised.
+        """
+        self._attach()
+        async with self._lock:
+            if self._stale:
+                # Drop what is left of a cancelled or timed out reply. Its
+                # end may still be on its way, the parser drops what comes
+                # before the echo of the new frame.
+                self.sp.reset_input_buffer()
+                self._rxrest = b''
+                self._stale = False
+            self.timed_out = False
+            lines = None
+            if expect is None:
+                expect, lines = reply_end(frame)
+            parser = ResponseParser(expect, lines=lines, echo=frame)
+            self._parser = parser
+            self._future = self._loop.create_future()
+            try:
+                rest, self._rxrest = self._rxrest, b''
+                if rest:
+                    self._feed(parser, rest)
+                self.sp.write(frame)
+                try:
+                    await asyncio.wait_for(self._future,
+                                           self.READ_TIMEOUT if timeout is None else timeout)
+                except asyncio.TimeoutError:
+                    self._stale = True
+                    self.timed_out = True
+                    if timeout is not None:
+                        raise ReaderTimeoutError("Reply not complete after {:.1f}s"
+                                                 .format(timeout)) from None
+                    self.logger.warning('Reply not complete after %.1fs', self.READ_TIMEOUT)
+            except asyncio.CancelledError:
+                self._stale = True
+                raise
+            finally:
+                if self._quiet is not None:
+                    self._quiet.cancel()
+                    self._quiet = None
+                self._parser = None
+                self._future = None
+        response = bytes(parser.buf)
+        if parser.dropped:
+            self.logger.debug('Dropped %d bytes of an older reply', parser.dropped)
+        self.logger.debug('RETR%3d: %r', len(response)/2, response)
+        if get_full_response:
+            return response
+        return response_payloads(response)
+
+    async def issue_iso15693_command(self, cmd, flags='', command_code='', data='',
+                                     expect=None, timeout=None):
+        if cmd == DLP_CMD["REQUESTCMD"]["code"]:
+            if command_code > 0x2C:
+                data = "04"+data #add manuf_code to command data
+            if expect is None:
+                expect = 1  # tag answer, '[]' if none
+        return await self.issue_evm_command(cmd, flags + '%02X'%command_code + data,
+                                            expect=expect, timeout=timeout)
+
+    async def tag_command(self, flags, command_code, data=b'', timeout=None):
+        """ Send a REQUESTCMD with data bytes, return the TagResponse
+
+        Failures are raised classified as PyDlpRfid2.tag_command() does,
+        without retry.
+        """
+        start = time.perf_counter()
+        response = await self.issue_frame(build_request(flags, command_code, data),
+                                          get_full_response=True, expect=1, timeout=timeout)
+        resp = parse_tag_answer(response, self.timed_out)
+        resp.elapsed = time.perf_counter() - start
+        return resp
+
+    async def iso15693_request(self, flags, command_code, data='', timeout=None):
+        """ tag_command() with hex string data, return the tag answer as a
+        hex string
+        """
+        resp = await self.tag_command(flags, command_code, bytes.fromhex(data), timeout)
+        return resp.hex()
+
+    async def tag_request(self, flags, command_code, data='', timeout=None):
+        # iso15693_request() returning None if no tag answered. A timeout
+        # given is raised.
+        try:
+            return await self.iso15693_request(flags, command_code, data, timeout)
+        except NoResponseError as exc:
+            if timeout is not None and isinstance(exc, ReaderTimeoutError):
+                raise
+            self.logger.debug('%s', exc)
+            return None
+
+    async def init_kit(self, timeout=None):
+        await self.configure([(DLP_CMD["INITIALIZE"]["code"], '')], timeout=timeout)
+
+    async def configure(self, commands, timeout=None):
+        # Send configuration commands, keeping self.chip up to date
+        for cmd, prms in commands:
+            try:
+                await self.issue_evm_command(cmd, prms, timeout=timeout)
+            except BaseException:
+                self.chip.reset()
+                raise
+            self.chip.update(cmd, prms)
+
+    async def enable_external_antenna(self, timeout=None):
+        await self.configure(self.chip.antenna_commands(DLP_CMD["EXTERNANT"]["code"]),
+                             timeout=timeout)
+
+    async def enable_internal_antenna(self, timeout=None):
+        await self.configure(self.chip.antenna_commands(DLP_CMD["INTERNANT"]["code"]),
+                             timeout=timeout)
+
+    async def set_protocol(self, protocol=ISO15693, timeout=None, force=False):
+        self.protocol = protocol
+        if force:
+            self.chip.reset()
+        await self.configure(self.chip.protocol_commands(protocol), timeout=timeout)
+
+    async def get_dlp_rfid2_firmware_version(self, timeout=None):
+        return await self.issue_evm_command(DLP_CMD["VERSION"]["code"],
+                                            get_full_response=True, timeout=timeout)
+
+    async def inventory(self, **kwargs):
+        if self.protocol == ISO15693:
+            return await self.inventory_iso15693(**kwargs)
+        elif self.protocol == ISO14443A:
+            raise StandardError("ISO14443A inventory is not available in async mode")
+
+    async def inventory_iso15693(self, single_slot=False, timeout=None):
+        response = await self.issue_iso15693_command(cmd=DLP_CMD["ANTICOL15693"]["code"],
+                                                     flags=flagsbyte(inventory=True,
+                                                                     single_slot=single_slot),
+                                                     command_code=NTAG5_CMD["INVENTORY"]["code"],
+                                                     data='00',
+                                                     expect=1 if single_slot else 16,
+                                                     timeout=timeout)
+        for uid, rssi in inventory_uids(response):
+            return uid, rssi
+
+    async def eeprom_get_system_info(self, uid=None, timeout=None):
+        address, data = uid_data(uid, '')
+        return await self.tag_request(flags=flagsbyte(address=address),
+                                      command_code=NTAG5_CMD["GET_SYS_INFO"]["code"],
+                                      data=data, timeout=timeout)
+
+    async def eeprom_read_single_block(self, uid, blockoffset, timeout=None):
+        address, data = uid_data(uid, '%02X%02X' % (blockoffset&0xFF, (blockoffset>>8)&0xFF))
+        resp = await self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                      command_code=NTAG5_CMD["READ_SINGLE_BLOCK"]["code"],
+                                      data=data, timeout=timeout)
+        if resp is None:
+            return None
+        return block_payload(resp, 1*4)
+
+    async def eeprom_read_multiple_block(self, uid, blocknum, blockoffset, timeout=None):
+        if blocknum < 1:
+            raise Exception("Blocknum can't be 0 or less")
+        address, data = uid_data(uid, '%02X%02X%02X' % (blockoffset&0xff, (blockoffset>>8)&0xff, blocknum-1))
+        resp = await self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                      command_code=NTAG5_CMD["READ_MULTIPLE_BLOCK"]["code"],
+                                      data=data, timeout=timeout)
+        if resp is None:
+            return None
+        return block_payload(resp)
+
+    async def eeprom_write_single_block(self, uid, block_offset, datastr, readback=True,
+                                        timeout=None):
+        address, data = uid_data(uid, write_block_data(block_offset, datastr))
+        resp = await self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                      command_code=NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"],
+                                      data=data, timeout=timeout)
+        if readback:
+            block_value = await self.eeprom_read_single_block(uid, block_offset, timeout=timeout)
+            if block_value != datastr:
+                raise Exception("Write error on block {}: read {} instead of {}"
+                        .format(block_offset, block_value, datastr))
+        return resp
+
+    async def eeprom_write_multiple_block(self, uid, block_offset, datalist, timeout=None):
+        resplist = []
+        for offset, data in enumerate(datalist, block_offset):
+            resp = await self.eeprom_write_single_block(uid, offset, "{:08X}".format(data),
+                                                        timeout=timeout)
+            if resp is None:
+                raise StandardError("Writing error on data {:08X}".format(data))
+            resplist.append(resp)
+        return resplist
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.sp.fileno())
+            self._loop = None
+        self.sp.close()
+
+    async def __aenter__(self):
+        self._attach()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
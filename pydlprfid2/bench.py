@@ -0,0 +1,214 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+""" Reader, inventory and EEPROM throughput benchmark
+
+Run on a real reader or on the emulator, print the results as JSON:
+
+    $ pdr2 bench -d/dev/ttyACM0 -uE0025E167B532A87
+    $ pdr2 bench --emulate -o bench.json
+
+Writes put back the content read from the tag, so a real tag is left as
+it was found.
+"""
+
+import io
+import sys
+import json
+import time
+import getopt
+import random
+import logging
+
+from .pydlprfid2 import PyDlpRfid2, DLP_CMD, ISO14443A, ISO15693, VERIFY_NONE, VERIFY_DEFERRED
+
+
+def percentiles(samples):
+    """ Latency summary in milliseconds """
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    def pick(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+    return {"count": len(samples),
+            "mean": sum(samples) / len(samples) * 1000,
+            "p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99),
+            "max": samples[-1] * 1000}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_evm_commands(reader, iterations):
+    # AGC selection: no RF traffic, no payload in the reply
+    cmd = DLP_CMD["AGCSEL"]["code"]
+    start = time.perf_counter()
+    for i in range(iterations):
+        reader.issue_evm_command(cmd=cmd, prms='00')
+    sequential = iterations / (time.perf_counter() - start)
+    with reader.pipeline(depth=8) as pipe:
+        for i in range(iterations):
+            pipe.submit(cmd, '00')
+    return {"sequential_per_sec": sequential,
+            "pipelined_per_sec": pipe.commands_per_sec}
+
+
+def bench_set_protocol(reader, iterations):
+    # Full configuration, as after opening the reader
+    return percentiles([timed(reader.set_protocol, force=True) for i in range(iterations)])
+
+
+def bench_switch_protocol(reader, iterations):
+    # Round trip ISO14443A and back, configuration otherwise unchanged
+    def switch():
+        reader.set_protocol(ISO14443A)
+        reader.set_protocol(ISO15693)
+    return percentiles([timed(switch) for i in range(iterations)])
+
+
+def bench_single_block(reader, uid, iterations, offset=0):
+    value = reader.eeprom_read_single_block(uid, offset)
+    reads = [timed(reader.eeprom_read_single_block, uid, offset)
+             for i in range(iterations)]
+    writes = [timed(reader.eeprom_write_single_block, uid, offset, value, readback=False)
+              for i in range(iterations)]
+    return {"read_ms": percentiles(reads), "write_ms": percentiles(writes)}
+
+
+def bench_bulk(reader, uid, blocknum, offset=0):
+    image = io.BytesIO()
+    dump = reader.eeprom_dump(uid, image, blocknum, offset)
+    datalist = [int.from_bytes(image.getvalue()[i:i + 4], 'big')
+                for i in range(0, dump.size, 4)]
+    results = {"blocks": blocknum, "read_bytes_per_sec": dump.rate}
+    for verify in (VERIFY_NONE, VERIFY_DEFERRED):
+        elapsed = timed(reader.eeprom_write_multiple_block, uid, offset, datalist,
+                        verify=verify)
+        results["write_{}_bytes_per_sec".format(verify)] = dump.size / elapsed
+    return results
+
+
+def bench_inventory(reader, iterations, emulator=None, tag_counts=(1, 2, 5, 10, 20, 50)):
+    """ Inventory time against the number of tags, the tags in the field
+    of a real reader, tag_counts ones with the emulator
+    """
+    results = {}
+    if emulator is None:
+        report = reader.inventory_all()
+        results[str(len(report))] = percentiles(
+                [reader.inventory_all().elapsed for i in range(iterations)])
+        return results
+    from .emulator import random_tags
+    tags = emulator.tags
+    rand = random.Random(0)
+    for count in tag_counts:
+        emulator.tags = random_tags(count, 0, rand)
+        samples = [reader.inventory_all().elapsed for i in range(iterations)]
+        results[str(count)] = percentiles(samples)
+    emulator.tags = tags
+    return results
+
+
+def run_benchmarks(reader, uid, iterations=50, blocknum=256, emulator=None):
+    """ Run every benchmark, return the results as a dict """
+    results = {"set_protocol_ms": bench_set_protocol(reader, max(1, iterations // 10))}
+    results["switch_protocol_ms"] = bench_switch_protocol(reader, max(1, iterations // 10))
+    results["evm_commands"] = bench_evm_commands(reader, iterations)
+    results["single_block"] = bench_single_block(reader, uid, iterations)
+    results["bulk"] = bench_bulk(reader, uid, blocknum)
+    results["inventory_ms"] = bench_inventory(reader, max(1, iterations // 10), emulator)
+    return results
+
+
+def usage():
+    """ print help """
+    print("Usage:")
+    print("pdr2 bench [options]")
+    print("-h, --help               print this help")
+    print("-d, --devtty=filename    uart dev name path")
+    print("-e, --emulate            run on the emulator instead of a reader")
+    print("-u, --uid=UID            tag to benchmark (first tag found by default)")
+    print("-n, --iterations=NBR     iterations per measure (50)")
+    print("-b, --blocks=NBR         blocks for bulk read and write (256)")
+    print("-l, --latency=SECONDS    emulator RF latency (0.002)")
+    print("-o, --output=FILE        write the JSON results to FILE")
+
+
+def launchmain(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hd:eu:n:b:l:o:",
+                                   ["help", "devtty=", "emulate", "uid=",
+                                    "iterations=", "blocks=", "latency=",
+                                    "output="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+
+    devtty = None
+    emulate = False
+    uid = None
+    iterations = 50
+    blocknum = 256
+    latency = 0.002
+    output = None
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage()
+            sys.exit(0)
+        elif opt in ("-d", "--devtty"):
+            devtty = arg
+        elif opt in ("-e", "--emulate"):
+            emulate = True
+        elif opt in ("-u", "--uid"):
+            uid = arg
+        elif opt in ("-n", "--iterations"):
+            iterations = int(arg)
+        elif opt in ("-b", "--blocks"):
+            blocknum = int(arg)
+        elif opt in ("-l", "--latency"):
+            latency = float(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+
+    if devtty is None and not emulate:
+        print("Wrong parameter: Give a devtty path or --emulate")
+        usage()
+        sys.exit(2)
+
+    emulator = None
+    if emulate:
+        from .emulator import Emulator, M24LR64ER
+        emulator = Emulator([M24LR64ER('E002000000000001')], rf_latency=latency, seed=0)
+        devtty = emulator.start()
+
+    reader = PyDlpRfid2(serial_port=devtty, loglevel=logging.WARNING)
+    try:
+        reader.set_protocol()
+        reader.enable_external_antenna()
+        if uid is None:
+            found = reader.inventory_iso15693(single_slot=True)
+            if found is None:
+                print("No tags found")
+                sys.exit(1)
+            uid = found[0]
+        from . import __version__
+        results = {"version": __version__,
+                   "port": devtty,
+                   "emulated": emulate,
+                   "uid": uid,
+                   "iterations": iterations,
+                   "results": run_benchmarks(reader, uid, iterations, blocknum, emulator)}
+    finally:
+        reader.close()
+        if emulator is not None:
+            emulator.stop()
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if output is None:
+        print(text)
+    else:
+        with open(output, "w") as fileobj:
+            fileobj.write(text + "\n")
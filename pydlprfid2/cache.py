@@ -0,0 +1,154 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Read-through / write-back cache of M24LR64E-R EEPROM blocks
+#
+# Blocks are kept per (uid, block offset) as the 8 hex digits string
+# eeprom_read_single_block() returns, in least recently used order.
+# Two consecutive block reads on a tag are taken as a sequential scan and
+# the following blocks are fetched with the same READ_MULTIPLE_BLOCK.
+#
+#   cache = BlockCache(reader, write_back=True)
+#   value = cache.read_single_block(uid, 4)
+#   cache.write_single_block(uid, 5, '01234567')
+#   cache.flush()
+#
+# Give cache.on_event to InventoryStream.run() to forget departed tags.
+
+import collections
+
+from .pydlprfid2 import StandardError
+from .stream import DEPARTED
+
+
+class BlockCache(object):
+
+    def __init__(self, reader, max_blocks=2048, prefetch=8, write_back=False,
+                 readback=True):
+        self.reader = reader
+        self.max_blocks = max_blocks
+        self.prefetch = prefetch
+        self.write_back = write_back
+        self.readback = readback
+        self.blocks = collections.OrderedDict()
+        self.dirty = {}
+        self.last_read = {}
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'prefetched': self.prefetched, 'blocks': len(self.blocks),
+                'dirty': len(self.dirty)}
+
+    def _store(self, uid, offset, value):
+        key = (uid, offset)
+        self.blocks[key] = value
+        self.blocks.move_to_end(key)
+        while len(self.blocks) > self.max_blocks:
+            key, value = self.blocks.popitem(last=False)
+            if key in self.dirty:
+                self._write(key[0], key[1], self.dirty.pop(key))
+
+    def _fetch(self, uid, blocknum, offset):
+        # Store blocknum blocks read from offset, return their values
+        if blocknum == 1:
+            value = self.reader.eeprom_read_single_block(uid, offset)
+        else:
+            value = self.reader.eeprom_read_multiple_block(uid, blocknum, offset)
+        if value is None:
+            raise StandardError("No answer reading block {} of {}".format(offset, uid))
+        values = []
+        for i in range(blocknum):
+            # A buffered write is newer than the tag content
+            key = (uid, offset + i)
+            values.append(self.dirty.get(key, value[i*8:i*8 + 8]))
+            self._store(uid, offset + i, values[-1])
+        return values
+
+    def read_single_block(self, uid, offset):
+        sequential = self.last_read.get(uid) == offset - 1
+        self.last_read[uid] = offset
+        value = self.blocks.get((uid, offset))
+        if value is not None:
+            self.hits += 1
+            self.blocks.move_to_end((uid, offset))
+            return value
+        self.misses += 1
+        prefetch = min(self.prefetch, self.max_blocks)
+        if sequential and prefetch > 1:
+            try:
+                values = self._fetch(uid, prefetch, offset)
+                self.prefetched += prefetch - 1
+            except StandardError:
+                # Past the end of the memory, read the block alone
+                values = self._fetch(uid, 1, offset)
+        else:
+            values = self._fetch(uid, 1, offset)
+        return values[0]
+
+    def read_multiple_block(self, uid, blocknum, offset):
+        if blocknum > self.max_blocks:
+            self.flush(uid)
+            return self.reader.eeprom_read_multiple_block(uid, blocknum, offset)
+        # The values are taken before fetching the missing blocks, storing
+        # them may evict the blocks of the range already cached
+        values = {}
+        missing = []
+        for block in range(offset, offset + blocknum):
+            value = self.blocks.get((uid, block))
+            if value is None:
+                missing.append(block)
+            else:
+                self.blocks.move_to_end((uid, block))
+                values[block] = value
+        self.hits += blocknum - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # One request covering every missing block
+            fetched = self._fetch(uid, missing[-1] - missing[0] + 1, missing[0])
+            values.update(enumerate(fetched, missing[0]))
+        self.last_read[uid] = offset + blocknum - 1
+        return ''.join(values[block] for block in range(offset, offset + blocknum))
+
+    def _write(self, uid, offset, value):
+        resp = self.reader.eeprom_write_single_block(uid, offset, value,
+                                                     readback=self.readback)
+        if resp is None:
+            raise StandardError("Writing error on block {} of {}".format(offset, uid))
+
+    def write_single_block(self, uid, offset, datastr):
+        value = "{:08X}".format(int(datastr, 16))
+        if self.write_back:
+            self.dirty[(uid, offset)] = value
+        else:
+            self._write(uid, offset, value)
+        self._store(uid, offset, value)
+
+    def flush(self, uid=None):
+        """ Write the buffered blocks of uid, or of every tag """
+        keys = [k for k in self.dirty if uid is None or k[0] == uid]
+        for key in sorted(keys, key=lambda k: (str(k[0]), k[1])):
+            self._write(key[0], key[1], self.dirty[key])
+            del self.dirty[key]
+
+    def invalidate(self, uid=None):
+        """ Forget the blocks of uid, or of every tag
+
+        Buffered writes of a forgotten tag are dropped.
+        """
+        if uid is None:
+            self.blocks.clear()
+            self.dirty.clear()
+            self.last_read.clear()
+            return
+        for key in [k for k in self.blocks if k[0] == uid]:
+            del self.blocks[key]
+            self.dirty.pop(key, None)
+        self.last_read.pop(uid, None)
+
+    def on_event(self, event):
+        if event.kind == DEPARTED:
+            self.invalidate(event.uid)
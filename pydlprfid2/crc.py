@@ -13,28 +13,53 @@
 # <http://www.biblev.no/RFID/dansk_rfid_datamodel.pdf>
 
 
+import binascii
+
+CRC_POLY = 0x1021
+CRC_INIT = 0xffff
+
+
+def crc16(data, crc=CRC_INIT):
+    """ CRC of bytes, bytearray or memoryview data, as an int
+
+    crc is the running value when the data comes in several parts.
+    binascii.crc_hqx() is the table driven C implementation of this CRC.
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def crc16_batch(images, crc=CRC_INIT):
+    """ CRCs of a sequence of images, as a list of int """
+    crc_hqx = binascii.crc_hqx
+    return [crc_hqx(image, crc) for image in images]
+
+
 class CRC(object):
 
-    def __init__(self):
-        pass
+    def __init__(self, data=b''):
+        self.crc_poly = CRC_POLY
+        self.crc_sum = crc16(data)
+
+    def update(self, data):
+        """ Add data to the CRC, return self to chain calls """
+        self.crc_sum = binascii.crc_hqx(data, self.crc_sum)
+        return self
+
+    @property
+    def value(self):
+        return self.crc_sum
+
+    def reset(self):
+        self.crc_sum = CRC_INIT
 
     def calculate(self, s):
-        self.crc_poly = 0x1021
-        self.crc_sum = 0xffff
-        for c in s:
-            self.update_crc(c)
-        r = '%02X' % self.crc_sum
+        """ CRC of s, bytes or a list of byte values, as a list of two hex strings """
+        self.crc_sum = crc16(bytes(s))
+        r = '%04X' % self.crc_sum
         return [r[i:i+2] for i in range(0, len(r), 2)]
 
     def update_crc(self, c):
-        c <<= 8
-        for i in range(0, 8):
-            xor_flag = ((self.crc_sum ^ c) & 0x8000) != 0
-            self.crc_sum = self.crc_sum << 1
-            if xor_flag:
-                self.crc_sum = self.crc_sum ^ self.crc_poly
-            c = c << 1
-        self.crc_sum &= 0xffff
+        self.crc_sum = binascii.crc_hqx(bytes((c,)), self.crc_sum)
 
 if __name__ == '__main__':
     # Test that should return 1AEE
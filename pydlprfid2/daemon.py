@@ -0,0 +1,194 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Reader daemon on a Unix domain socket
+#
+# The daemon keeps one PyDlpRfid2 open and initialized, clients send it one
+# JSON request per line and get one JSON reply per line:
+#
+#   {"op": "read_single_block", "uid": "E002...", "blockoffset": 3}
+#   {"result": "DEADBEEF"}  or  {"error": "...", "type": "TagError", "code": 16}
+#
+#   $ pdr2 --daemon -d/dev/ttyACM0 &
+#   $ pdr2 -r3 -uE0025E167B532A87
+#
+# DaemonClient has the same methods as PyDlpRfid2 for the operations of
+# the pdr2 command line, so it can stand in for the reader there.
+
+import os
+import json
+import socket
+import threading
+import socketserver
+
+from .pydlprfid2 import StandardError, InventoryReport, DeltaReport, VERIFY_BLOCK, VERIFY_DEFERRED
+
+
+def default_socket_path():
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or '/tmp', 'pdr2.sock')
+
+
+class RemoteError(StandardError):
+    """ The daemon failed to execute the request
+
+    name is the class name of the exception raised in the daemon, code the
+    ISO15693 error code for a TagError.
+    """
+
+    def __init__(self, message, name=None, code=None, retryable=False):
+        super().__init__(message)
+        self.name = name
+        self.code = code
+        self.retryable = retryable
+
+
+def _inventory(reader):
+    report = reader.inventory_all()
+    return {"tags": report.tags, "rounds": report.rounds,
+            "collisions": report.collisions, "elapsed": report.elapsed}
+
+
+def _write_delta(reader, uid, block_offset, datalist, verify=VERIFY_DEFERRED):
+    report = reader.eeprom_write_delta(uid, block_offset, datalist, verify=verify)
+    return {"written": report.written, "skipped": report.skipped,
+            "ranges": report.ranges, "elapsed": report.elapsed}
+
+
+# op -> function(reader, **params)
+OPERATIONS = {
+    "ping": lambda reader: True,
+    "inventory": _inventory,
+    "system_info": lambda reader, uid=None: reader.eeprom_get_system_info(uid),
+    "read_single_block": lambda reader, uid, blockoffset:
+        reader.eeprom_read_single_block(uid, blockoffset),
+    "read_multiple_block": lambda reader, uid, blocknum, blockoffset:
+        reader.eeprom_read_multiple_block(uid, blocknum, blockoffset),
+    "write_single_block": lambda reader, uid, block_offset, datastr, readback=True:
+        reader.eeprom_write_single_block(uid, block_offset, datastr, readback),
+    "write_multiple_block": lambda reader, uid, block_offset, datalist, verify=VERIFY_BLOCK:
+        reader.eeprom_write_multiple_block(uid, block_offset, datalist, verify=verify),
+    "write_delta": _write_delta,
+}
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = self.server.execute(line)
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ReaderDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Serve reader requests on the Unix socket path
+
+    Clients are served concurrently, their requests to the reader one at
+    a time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, reader, path=None):
+        self.reader = reader
+        self.path = default_socket_path() if path is None else path
+        self.lock = threading.Lock()
+        self.requests = 0
+        if os.path.exists(self.path):
+            # Left by a daemon that died, refuse to steal a live one
+            try:
+                DaemonClient(self.path).call("ping")
+            except (OSError, RemoteError):
+                os.unlink(self.path)
+            else:
+                raise StandardError("A daemon already listens on {}".format(self.path))
+        umask = os.umask(0o077)
+        try:
+            super().__init__(self.path, DaemonHandler)
+        finally:
+            os.umask(umask)
+
+    def execute(self, line):
+        try:
+            request = json.loads(line)
+            operation = OPERATIONS[request.pop("op")]
+        except (ValueError, KeyError, AttributeError) as exc:
+            return {"error": "Bad request: {}".format(exc), "type": "ValueError"}
+        try:
+            with self.lock:
+                self.requests += 1
+                return {"result": operation(self.reader, **request)}
+        except Exception as exc:
+            return {"error": str(exc), "type": type(exc).__name__,
+                    "code": getattr(exc, 'code', None),
+                    "retryable": bool(getattr(exc, 'retryable', False))}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class DaemonClient(object):
+    """ Client of a ReaderDaemon, one connection kept open """
+
+    def __init__(self, path=None, timeout=30.0):
+        self.path = default_socket_path() if path is None else path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.path)
+        self.fileobj = self.sock.makefile('rwb')
+
+    def call(self, op, **params):
+        params["op"] = op
+        self.fileobj.write(json.dumps(params).encode('utf-8') + b'\n')
+        self.fileobj.flush()
+        line = self.fileobj.readline()
+        if not line:
+            raise RemoteError("Daemon closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RemoteError(reply["error"], reply.get("type"), reply.get("code"),
+                              reply.get("retryable", False))
+        return reply["result"]
+
+    def inventory_all(self):
+        report = self.call("inventory")
+        return InventoryReport([tuple(tag) for tag in report["tags"]], report["rounds"],
+                               report["collisions"], report["elapsed"])
+
+    def eeprom_get_system_info(self, uid=None):
+        return self.call("system_info", uid=uid)
+
+    def eeprom_read_single_block(self, uid, blockoffset):
+        return self.call("read_single_block", uid=uid, blockoffset=blockoffset)
+
+    def eeprom_read_multiple_block(self, uid, blocknum, blockoffset):
+        return self.call("read_multiple_block", uid=uid, blocknum=blocknum,
+                         blockoffset=blockoffset)
+
+    def eeprom_write_single_block(self, uid, block_offset, datastr, readback=True):
+        return self.call("write_single_block", uid=uid, block_offset=block_offset,
+                         datastr=datastr, readback=readback)
+
+    def eeprom_write_multiple_block(self, uid, block_offset, datalist, verify=VERIFY_BLOCK):
+        return self.call("write_multiple_block", uid=uid, block_offset=block_offset,
+                         datalist=list(datalist), verify=verify)
+
+    def eeprom_write_delta(self, uid, block_offset, datalist, verify=VERIFY_DEFERRED):
+        report = self.call("write_delta", uid=uid, block_offset=block_offset,
+                           datalist=list(datalist), verify=verify)
+        return DeltaReport(report["written"], report["skipped"],
+                           [tuple(r) for r in report["ranges"]], report["elapsed"])
+
+    def close(self):
+        self.fileobj.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
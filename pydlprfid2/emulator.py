@@ -0,0 +1,504 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+""" DLP-RFID2 emulator
+
+A virtual DLP-RFID2 on a Linux pseudo-terminal, with emulated tags in its
+field, to test and benchmark without hardware:
+
+    emu = Emulator([M24LR64ER('E002223344556677'), Ntag5('E004010012345678')],
+                   rf_latency=0.002)
+    emu.start()
+    reader = PyDlpRfid2(emu.port)
+    ...
+    emu.stop()
+
+It decodes the EVM frames issue_evm_command() builds (SOF, length, 03 04,
+command, parameters, 0000), echoes them like the firmware does and prints
+the tag answers between brackets. The TRF7970A registers are kept in
+Emulator.registers.
+
+Faults can be injected at random with a seed (drop_rate, collision_rate,
+error_rate), or deterministically with inject().
+"""
+
+import os
+import sys
+import time
+import tty
+import random
+import select
+import getopt
+import threading
+import collections
+
+ISO15693_FLAG_ERROR = 0x01
+ISO15693_FLAG_INVENTORY = 0x04
+ISO15693_FLAG_PROTOCOL_EXTENSION = 0x08
+ISO15693_FLAG_SELECT = 0x10
+ISO15693_FLAG_ADDRESS = 0x20
+ISO15693_FLAG_SINGLE_SLOT = 0x20
+
+# Fault kinds
+DROP = 'drop'               # the tag does not answer
+COLLISION = 'collision'     # the answer is garbled
+ERROR = 'error'             # the tag answers error 0x0F
+
+
+class TagError(Exception):
+    """ Tag answer with the error flag """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class Iso15693Tag(object):
+    """ Tag with a blocks memory answering the mandatory ISO15693 commands """
+
+    MANUFACTURER = None
+    BLOCKS = 0
+    BLOCK_SIZE = 4
+    MAX_READ_BLOCKS = 32
+    SECTOR_BLOCKS = None
+
+    def __init__(self, uid, rssi=0x40, fill=0x00):
+        if len(uid) != 16:
+            raise ValueError("Wrong uid size {}, should be 16".format(len(uid)))
+        self.uid = uid.upper()
+        self.uid_value = int(uid, 16)
+        self.rssi = rssi
+        self.memory = bytearray([fill]) * (self.BLOCKS * self.BLOCK_SIZE)
+        self.selected = False
+        self.quiet = False
+
+    def block(self, offset, count=1):
+        if offset + count > self.BLOCKS:
+            raise TagError(0x10)
+        return bytes(self.memory[offset*self.BLOCK_SIZE:(offset + count)*self.BLOCK_SIZE])
+
+    def answer(self, flags, code, prms):
+        """ Return the answer bytes (flags included) to a request """
+        extended = flags & ISO15693_FLAG_PROTOCOL_EXTENSION
+        addrsize = 2 if extended else 1
+        if code == 0x20:    # READ_SINGLE_BLOCK
+            offset = int.from_bytes(prms[:addrsize], 'little')
+            return b'\x00' + self.block(offset)
+        if code == 0x21:    # WRITE_SINGLE_BLOCK
+            offset = int.from_bytes(prms[:addrsize], 'little')
+            data = prms[addrsize:addrsize + self.BLOCK_SIZE]
+            if len(data) != self.BLOCK_SIZE:
+                raise TagError(0x0F)
+            self.block(offset)
+            self.memory[offset*self.BLOCK_SIZE:(offset + 1)*self.BLOCK_SIZE] = data
+            return b'\x00'
+        if code == 0x23:    # READ_MULTIPLE_BLOCK
+            offset = int.from_bytes(prms[:addrsize], 'little')
+            count = prms[addrsize] + 1
+            if count > self.MAX_READ_BLOCKS:
+                raise TagError(0x0F)
+            if self.SECTOR_BLOCKS and offset // self.SECTOR_BLOCKS != (offset + count - 1) // self.SECTOR_BLOCKS:
+                raise TagError(0x0F)
+            return b'\x00' + self.block(offset, count)
+        if code == 0x25:    # SELECT
+            self.selected = True
+            return b'\x00'
+        if code == 0x26:    # RESET_TO_READY
+            self.selected = False
+            self.quiet = False
+            return b'\x00'
+        if code == 0x02:    # QUIET
+            self.quiet = True
+            return None
+        if code == 0x2B:    # GET_SYS_INFO
+            return (b'\x00\x0F' + self.uid_value.to_bytes(8, 'little') + b'\x00\x00'
+                    + (self.BLOCKS - 1).to_bytes(2, 'little') + bytes([self.BLOCK_SIZE - 1, 0x00]))
+        return self.custom(code, prms)
+
+    def custom(self, code, prms):
+        raise TagError(0x01)
+
+
+class M24LR64ER(Iso15693Tag):
+    """ ST M24LR64E-R: 2048 blocks of 4 bytes in 32 blocks sectors """
+
+    MANUFACTURER = 0x02
+    BLOCKS = 2048
+    SECTOR_BLOCKS = 32
+
+
+class Ntag5(Iso15693Tag):
+    """ NXP NTAG 5 link with configuration memory, session registers and
+    the 256 bytes SRAM used for pass-through
+
+    The MCU side of the I2C interface is emulated by mcu_write_sram(),
+    mcu_read_sram() and set_direction().
+    """
+
+    MANUFACTURER = 0x04
+    BLOCKS = 512
+    SRAM_BLOCKS = 64
+    MAX_READ_BLOCKS = 64
+
+    # Session registers (block, byte, mask)
+    SRAM_DATA_RDY = (0xA0, 0, 0b00100000)
+    PT_TRANSFER_DIR = (0xA1, 1, 0b00000001)
+    SRAM_ENABLED = (0xA1, 1, 0b00000010)
+    ED_CONFIG = (0xA8, 0, 0b00001111)
+
+    def __init__(self, uid, rssi=0x40, fill=0x00):
+        super().__init__(uid, rssi, fill)
+        self.config = collections.defaultdict(lambda: bytearray(4))
+        self.sram = bytearray(self.SRAM_BLOCKS * 4)
+        self.lock = threading.Lock()
+        self.set_register(self.SRAM_ENABLED, 1)
+        self.set_direction(nfc_to_i2c=True)
+
+    def register(self, reg):
+        block, byte, mask = reg
+        value = self.config[block][byte] & mask
+        return value // (mask & -mask)
+
+    def set_register(self, reg, value):
+        block, byte, mask = reg
+        shift = (mask & -mask).bit_length() - 1
+        data = self.config[block]
+        data[byte] = (data[byte] & ~mask & 0xFF) | ((value << shift) & mask)
+
+    def set_direction(self, nfc_to_i2c):
+        # PT_TRANSFER_DIR and the event detection pin configuration the
+        # MCU firmware sets when switching the pass-through direction
+        with self.lock:
+            self.set_register(self.PT_TRANSFER_DIR, 1 if nfc_to_i2c else 0)
+            self.set_register(self.ED_CONFIG, 4 if nfc_to_i2c else 3)
+
+    def mcu_write_sram(self, data):
+        """ MCU writes a message for the NFC side """
+        with self.lock:
+            self.sram[:] = bytes(len(self.sram))
+            self.sram[:len(data)] = data
+            self.set_register(self.SRAM_DATA_RDY, 1)
+
+    def mcu_read_sram(self):
+        """ MCU reads the SRAM written by the NFC side, None if not ready """
+        with self.lock:
+            if not self.register(self.SRAM_DATA_RDY):
+                return None
+            self.set_register(self.SRAM_DATA_RDY, 0)
+            return bytes(self.sram)
+
+    def custom(self, code, prms):
+        with self.lock:
+            if code == 0xC0:    # READ_CONF: address, number of blocks - 1
+                address, count = prms[0], prms[1] + 1
+                return b'\x00' + b''.join(bytes(self.config[address + i]) for i in range(count))
+            if code == 0xC1:    # WRITE_CONF: address, data
+                if len(prms) < 5:
+                    raise TagError(0x0F)
+                self.config[prms[0]][:] = prms[1:5]
+                return b'\x00'
+            if code == 0xD2:    # READ_SRAM: address, number of blocks - 1
+                address, count = prms[0], prms[1] + 1
+                if address + count > self.SRAM_BLOCKS:
+                    raise TagError(0x10)
+                if address + count == self.SRAM_BLOCKS and not self.register(self.PT_TRANSFER_DIR):
+                    # Reading the last block hands the SRAM back to the MCU
+                    self.set_register(self.SRAM_DATA_RDY, 0)
+                return b'\x00' + bytes(self.sram[address*4:(address + count)*4])
+            if code == 0xD3:    # WRITE_SRAM: address, number of blocks - 1, data
+                address, count = prms[0], prms[1] + 1
+                data = prms[2:2 + count*4]
+                if address + count > self.SRAM_BLOCKS or len(data) != count*4:
+                    raise TagError(0x10)
+                self.sram[address*4:(address + count)*4] = data
+                if address + count == self.SRAM_BLOCKS and self.register(self.PT_TRANSFER_DIR):
+                    # Writing the last block hands the SRAM over to the MCU
+                    self.set_register(self.SRAM_DATA_RDY, 1)
+                return b'\x00'
+        raise TagError(0x01)
+
+
+class Emulator(object):
+
+    def __init__(self, tags=(), latency=0.0, rf_latency=0.0, command_latency=None,
+                 drop_rate=0.0, collision_rate=0.0, error_rate=0.0, seed=None):
+        """ latency is added to every command, rf_latency to the ones going
+        over the air, command_latency maps EVM command codes ('18') to a
+        latency replacing both
+        """
+        self.tags = list(tags)
+        self.latency = latency
+        self.rf_latency = rf_latency
+        self.command_latency = {} if command_latency is None else command_latency
+        self.drop_rate = drop_rate
+        self.collision_rate = collision_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.faults = collections.deque()
+        self.registers = bytearray(0x20)
+        self.antenna = None
+        self.agc = None
+        self.ampm = None
+        self.commands = collections.Counter()
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+
+    def add_tag(self, tag):
+        self.tags.append(tag)
+
+    def remove_tag(self, uid):
+        self.tags = [tag for tag in self.tags if tag.uid != uid.upper()]
+
+    def inject(self, kind, count=1):
+        """ Make the next count tag answers fail with kind """
+        self.faults.extend([kind] * count)
+
+    def _fault(self):
+        if self.faults:
+            return self.faults.popleft()
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            return DROP
+        if self.collision_rate and self.random.random() < self.collision_rate:
+            return COLLISION
+        if self.error_rate and self.random.random() < self.error_rate:
+            return ERROR
+        return None
+
+    def start(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='dlprfid2-emulator',
+                                        daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _run(self):
+        buf = b''
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                buf += os.read(self._master, 4096)
+            except OSError:
+                break
+            while True:
+                # Resynchronize on SOF
+                start = buf.find(b'01')
+                if start < 0 or len(buf) - start < 6:
+                    buf = buf[start:] if start >= 0 else b''
+                    break
+                buf = buf[start:]
+                try:
+                    length = int(buf[4:6] + buf[2:4], 16) * 2
+                except ValueError:
+                    buf = buf[2:]
+                    continue
+                if length < 14:
+                    buf = buf[2:]
+                    continue
+                if len(buf) < length:
+                    break
+                frame, buf = buf[:length], buf[length:]
+                # The firmware echoes the frame at once, then answers once
+                # the command, over the air or not, is done.
+                os.write(self._master, frame.upper() + b'\r\n')
+                delay = self.delay(frame)
+                if delay:
+                    time.sleep(delay)
+                os.write(self._master, self.handle(frame))
+
+    def delay(self, frame):
+        """ Return the time taken by the command of frame before its answer """
+        cmd = frame[10:12].upper().decode('ascii', 'replace')
+        rf = cmd in ('14', '18')
+        return self.command_latency.get(cmd, self.latency + (self.rf_latency if rf else 0.0))
+
+    def handle(self, frame):
+        """ Return the firmware output for one frame (ascii hex bytes)
+        following its echo
+        """
+        frame = frame.upper()
+        cmd = frame[10:12].decode('ascii')
+        try:
+            prms = bytes.fromhex(frame[12:-4].decode('ascii'))
+        except ValueError:
+            return b''
+        self.commands[cmd] += 1
+        out = b''
+        if cmd == 'FF':
+            self.registers[:] = bytes(len(self.registers))
+            out += b'\r\nTRF7970A EVM \r\n'
+        elif cmd == 'FE':
+            out += b'\r\nTRF7970A EVM emulator\r\n'
+        elif cmd == '10':
+            for i in range(0, len(prms) - 1, 2):
+                self.registers[prms[i] & 0x1F] = prms[i + 1]
+            out += b'\r\nRegister write request.\r\n'
+        elif cmd == '12':
+            out += b''.join(b'[%02X]' % self.registers[reg & 0x1F] for reg in prms) + b'\r\n'
+        elif cmd in ('2A', '2B'):
+            self.antenna = cmd
+        elif cmd == 'F0':
+            self.agc = prms[:1].hex().upper()
+        elif cmd == 'F1':
+            self.ampm = prms[:1].hex().upper()
+        elif cmd == '14':
+            out += b'\r\nISO 15693 Inventory request.\r\n' + self.inventory(prms)
+        elif cmd == '18':
+            out += b'\r\nRequest mode.\r\n' + self.request(prms)
+        return out
+
+    def inventory(self, prms):
+        if len(prms) < 3:
+            return b'[]\r\n'
+        flags, mask_length = prms[0], prms[2]
+        mask = int.from_bytes(prms[3:3 + (mask_length + 7)//8], 'little')
+        mask &= (1 << mask_length) - 1
+        tags = [tag for tag in self.tags if not tag.quiet
+                and tag.uid_value & ((1 << mask_length) - 1) == mask]
+        nslots = 1 if flags & ISO15693_FLAG_SINGLE_SLOT else 16
+        slots = [[] for _ in range(nslots)]
+        for tag in tags:
+            slot = 0 if nslots == 1 else (tag.uid_value >> mask_length) & 0x0F
+            slots[slot].append(tag)
+        out = b''
+        for found in slots:
+            fault = self._fault() if found else None
+            if not found or fault == DROP:
+                out += b'[]\r\n'
+            elif len(found) > 1 or fault == COLLISION:
+                out += b'[z]\r\n'
+            else:
+                out += b'[%s,%02X]\r\n' % (found[0].uid.encode('ascii'), found[0].rssi)
+        return out
+
+    def request(self, prms):
+        if len(prms) < 2:
+            return b'[]\r\n'
+        flags, code = prms[0], prms[1]
+        prms = prms[2:]
+        if code > 0x2C:
+            # Custom and proprietary commands carry the manufacturer code
+            manufacturer, prms = prms[0], prms[1:]
+        else:
+            manufacturer = None
+        if flags & ISO15693_FLAG_ADDRESS:
+            uid, prms = int.from_bytes(prms[:8], 'little'), prms[8:]
+            tags = [tag for tag in self.tags if tag.uid_value == uid]
+        elif flags & ISO15693_FLAG_SELECT:
+            tags = [tag for tag in self.tags if tag.selected]
+        else:
+            tags = [tag for tag in self.tags if not tag.quiet]
+        if manufacturer is not None:
+            tags = [tag for tag in tags if tag.MANUFACTURER == manufacturer]
+        if not tags:
+            return b'[]\r\n'
+        fault = self._fault()
+        if fault == DROP:
+            return b'[]\r\n'
+        if len(tags) > 1 or fault == COLLISION:
+            return b'[z]\r\n'
+        if fault == ERROR:
+            return b'[010F]\r\n'
+        try:
+            answer = tags[0].answer(flags, code, prms)
+        except TagError as exc:
+            answer = bytes([ISO15693_FLAG_ERROR, exc.code])
+        if answer is None:
+            return b'[]\r\n'
+        return b'[' + answer.hex().upper().encode('ascii') + b']\r\n'
+
+
+def usage():
+    """ print help """
+    print("Usage:")
+    print("$ dlpemu [options]")
+    print("-h, --help               print this message")
+    print("-m, --m24lr=NBR          number of M24LR64E-R tags in the field (1)")
+    print("-n, --ntag5=NBR          number of NTAG5 tags in the field (0)")
+    print("-l, --latency=SECONDS    latency of RF commands (0)")
+    print("--drop=RATE              rate of tag answers lost")
+    print("--collision=RATE         rate of garbled tag answers")
+    print("--error=RATE             rate of tag error answers")
+    print("--seed=SEED              random seed for uids and faults")
+
+
+def random_tags(nm24lr, nntag5, rand):
+    tags = []
+    for i in range(nm24lr):
+        tags.append(M24LR64ER('E002%012X' % rand.getrandbits(48), rssi=rand.randrange(0x30, 0x70)))
+    for i in range(nntag5):
+        tags.append(Ntag5('E004%012X' % rand.getrandbits(48), rssi=rand.randrange(0x30, 0x70)))
+    return tags
+
+
+def launchmain(argv):
+    try:
+        opts, args = getopt.getopt(argv, "hm:n:l:",
+                                   ["help", "m24lr=", "ntag5=", "latency=",
+                                    "drop=", "collision=", "error=", "seed="])
+    except getopt.GetoptError as err:
+        print(err)
+        usage()
+        sys.exit(2)
+
+    nm24lr = 1
+    nntag5 = 0
+    kwargs = {}
+    seed = None
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage()
+            sys.exit(0)
+        elif opt in ("-m", "--m24lr"):
+            nm24lr = int(arg)
+        elif opt in ("-n", "--ntag5"):
+            nntag5 = int(arg)
+        elif opt in ("-l", "--latency"):
+            kwargs["rf_latency"] = float(arg)
+        elif opt == "--drop":
+            kwargs["drop_rate"] = float(arg)
+        elif opt == "--collision":
+            kwargs["collision_rate"] = float(arg)
+        elif opt == "--error":
+            kwargs["error_rate"] = float(arg)
+        elif opt == "--seed":
+            seed = int(arg)
+
+    emu = Emulator(random_tags(nm24lr, nntag5, random.Random(seed)), seed=seed, **kwargs)
+    emu.start()
+    print("DLP-RFID2 emulator on {}".format(emu.port))
+    for tag in emu.tags:
+        print("{} UID: {}".format(type(tag).__name__, tag.uid))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emu.stop()
+
+
+if __name__ == "__main__":
+    launchmain(sys.argv[1:])
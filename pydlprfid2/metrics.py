@@ -0,0 +1,133 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Per command latency metrics
+#
+# Counts, errors and latency histograms per EVM command code, with the time
+# split between serial write, waiting for the reply and parsing it, and per
+# ISO15693 request code with the retries. Disabled unless a CommandMetrics
+# is given to the reader:
+#
+#   metrics = reader.enable_metrics()
+#   ...
+#   print(metrics.prometheus())
+
+import threading
+
+# Histogram upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+EVM = 'evm'
+ISO15693 = 'iso15693'
+
+
+class CommandStats(object):
+
+    __slots__ = ('count', 'errors', 'retries', 'total', 'write', 'wait', 'parse', 'buckets')
+
+    def __init__(self, nbuckets):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self.write = 0.0
+        self.wait = 0.0
+        self.parse = 0.0
+        self.buckets = [0] * nbuckets
+
+    def as_dict(self, bounds):
+        return {"count": self.count, "errors": self.errors, "retries": self.retries,
+                "seconds": self.total, "write_seconds": self.write,
+                "wait_seconds": self.wait, "parse_seconds": self.parse,
+                "buckets": dict(zip(bounds, self.buckets))}
+
+
+class CommandMetrics(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS, hook=None):
+        """ hook(kind, code, elapsed, error) is called on each command,
+        kind being EVM or ISO15693
+        """
+        self.bounds = tuple(buckets)
+        self.hook = hook
+        self.stats = {EVM: {}, ISO15693: {}}
+        self.lock = threading.Lock()
+
+    def _record(self, kind, code, elapsed, error):
+        with self.lock:
+            stats = self.stats[kind].get(code)
+            if stats is None:
+                stats = self.stats[kind][code] = CommandStats(len(self.bounds))
+            stats.count += 1
+            stats.total += elapsed
+            if error:
+                stats.errors += 1
+            for i, bound in enumerate(self.bounds):
+                if elapsed <= bound:
+                    stats.buckets[i] += 1
+                    break
+        if self.hook is not None:
+            self.hook(kind, code, elapsed, error)
+        return stats
+
+    def record_evm(self, cmd, elapsed, write, wait, parse, error=False):
+        stats = self._record(EVM, cmd, elapsed, error)
+        with self.lock:
+            stats.write += write
+            stats.wait += wait
+            stats.parse += parse
+
+    def record_iso15693(self, code, elapsed, retries=0, error=False):
+        stats = self._record(ISO15693, '%02X' % code, elapsed, error)
+        with self.lock:
+            stats.retries += retries
+
+    def snapshot(self):
+        """ Return the metrics as a dict kind -> code -> values """
+        with self.lock:
+            return {kind: {code: stats.as_dict(self.bounds) for code, stats in codes.items()}
+                    for kind, codes in self.stats.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stats = {EVM: {}, ISO15693: {}}
+
+    def prometheus(self, prefix='dlprfid2'):
+        """ Return the metrics in Prometheus text exposition format """
+        lines = []
+        with self.lock:
+            for kind, label in ((EVM, 'cmd'), (ISO15693, 'code')):
+                codes = sorted(self.stats[kind].items())
+                name = '{}_{}'.format(prefix, kind)
+                counters = [('commands_total', 'Commands issued', 'count'),
+                            ('errors_total', 'Commands failed', 'errors')]
+                if kind == ISO15693:
+                    counters.append(('retries_total', 'Retried attempts', 'retries'))
+                for suffix, text, attr in counters:
+                    lines.append('# HELP {}_{} {}'.format(name, suffix, text))
+                    lines.append('# TYPE {}_{} counter'.format(name, suffix))
+                    for code, stats in codes:
+                        lines.append('{}_{}{{{}="{}"}} {}'.format(
+                            name, suffix, label, code, getattr(stats, attr)))
+                if kind == EVM:
+                    lines.append('# HELP {}_phase_seconds_total Time spent per phase'.format(name))
+                    lines.append('# TYPE {}_phase_seconds_total counter'.format(name))
+                    for code, stats in codes:
+                        for phase in ('write', 'wait', 'parse'):
+                            lines.append('{}_phase_seconds_total{{{}="{}",phase="{}"}} {!r}'.format(
+                                name, label, code, phase, getattr(stats, phase)))
+                lines.append('# HELP {}_latency_seconds Command latency'.format(name))
+                lines.append('# TYPE {}_latency_seconds histogram'.format(name))
+                for code, stats in codes:
+                    cumulated = 0
+                    for bound, count in zip(self.bounds, stats.buckets):
+                        cumulated += count
+                        lines.append('{}_latency_seconds_bucket{{{}="{}",le="{}"}} {}'.format(
+                            name, label, code, bound, cumulated))
+                    lines.append('{}_latency_seconds_bucket{{{}="{}",le="+Inf"}} {}'.format(
+                        name, label, code, stats.count))
+                    lines.append('{}_latency_seconds_sum{{{}="{}"}} {!r}'.format(
+                        name, label, code, stats.total))
+                    lines.append('{}_latency_seconds_count{{{}="{}"}} {}'.format(
+                        name, label, code, stats.count))
+        return '\n'.join(lines) + '\n'
@@ -1,15 +1,20 @@
 import sys
-import asyncio
-import serial
 import logging
-import re
 import time
 import math
+import functools
 from pydlprfid2 import PyDlpRfid2, ISO14443A, ISO14443B, ISO15693#, DLP_CMD, NTAG5_CMD, NTAG5_ADDR
+from pydlprfid2.pydlprfid2 import StandardError
 # from crc import CRC
 
-import pkg_resources  # part of setuptools
-__version__ = pkg_resources.require('pydlprfid2')[0].version
+def __getattr__(name):
+    # __version__ is looked up on first access only, it is slow
+    global __version__
+    if name == "__version__":
+        from pydlprfid2 import package_version
+        __version__ = package_version()
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 logger = logging.getLogger(__name__)
 manuf_code = "04"
@@ -100,6 +105,52 @@ NTAG5_REGISTERS = {
         "ED_CONFIG_REG":  {"address": 0xA8, "byte": 0x00, "ED_CONFIG_mask": 0b00001111},
         }
 
+def register_masks(entry):
+  # Masks of a NTAG5_REGISTERS or NTAG5_CONFIG entry, by name
+  return {name: mask for name, mask in entry.items() if name not in ("address", "byte")}
+
+class RegisterSnapshot(object):
+  """ NTAG5 configuration and session register blocks read in one poll
+
+  blocks maps a block address to its 4 bytes, None if the read failed.
+  Values are decoded locally with the masks of NTAG5_REGISTERS and
+  NTAG5_CONFIG, unshifted as get_register_bit() returns them.
+  """
+
+  def __init__(self, blocks, timestamp):
+    self.blocks = blocks
+    self.timestamp = timestamp
+
+  @property
+  def age(self):
+    return time.monotonic() - self.timestamp
+
+  def byte(self, address, byte):
+    block = self.blocks.get(address)
+    if block is None: return None
+    return block[byte]
+
+  def register_bit(self, register, bit_mask):
+    value = self.byte(NTAG5_REGISTERS[register]["address"], NTAG5_REGISTERS[register]["byte"])
+    if value is None: return None
+    return value & NTAG5_REGISTERS[register][bit_mask]
+
+  def config_bit(self, config, bit_mask):
+    value = self.byte(NTAG5_CONFIG[config]["address"], NTAG5_CONFIG[config]["byte"])
+    if value is None: return None
+    return value & NTAG5_CONFIG[config][bit_mask]
+
+  def decode(self):
+    """ Return {name: {mask name: value}} for every register and config in the snapshot """
+    decoded = {}
+    for table in (NTAG5_REGISTERS, NTAG5_CONFIG):
+      for name, entry in table.items():
+        value = self.byte(entry["address"], entry["byte"])
+        if entry["address"] not in self.blocks or value is None: continue
+        decoded[name] = {mask_name: value & mask for mask_name, mask in register_masks(entry).items()}
+    return decoded
+
+@functools.lru_cache(maxsize=None)
 def flagsbyte(double_sub_carrier=False, high_data_rate=False, inventory=False,
               protocol_extension=False, afi=False, single_slot=False,
               option=False, select=False, address=False):
@@ -123,18 +174,30 @@ def flagsbyte(double_sub_carrier=False, high_data_rate=False, inventory=False,
 class NtagInterface(PyDlpRfid2):
   app_state = None
   start_time = 0
+  # Set by finish(), stops the StateScheduler
+  exit_code = None
+  # A register snapshot younger than this (s) is used instead of reading the tag
+  SNAPSHOT_MAX_AGE = 0.1
 
-  def __init__(self):
+  def __init__(self, serial_port="/dev/ttyUSB0", snapshot_max_age=None):
     self.app_state="state_initialization"
-    super().__init__(serial_port="/dev/ttyUSB0", loglevel=logging.INFO)
+    self.snapshot_max_age = self.SNAPSHOT_MAX_AGE if snapshot_max_age is None else snapshot_max_age
+    self._snapshot = None
+    super().__init__(serial_port=serial_port, loglevel=logging.INFO)
 
   #low level interface methods:
+  def read_config_block(self, address):
+    # Return the 4 bytes of the configuration or session register block
+    data = self.tag_command(flagsbyte(), NTAG5_CMD["READ_CONF"]["code"], bytes((address, 0))).payload
+    if len(data) < 4: raise StandardError(f"Short configuration block {data.hex()}")
+    return bytes(data[:4])
+
   def get_memory_block(self, address):
     response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
                                 flags=flagsbyte(),
                                 command_code=NTAG5_CMD["READ_CONF"]["code"],
                                 data = f"{address:02X}{'00'}")
-    if len(response) < 0 and len(response[0]) > 1: return self.logger.error("failed to get memory block")
+    if len(response) < 1 or len(response[0]) < 10: return self.logger.error("failed to get memory block")
     data = response[0][2:]
     return data[:8]
 
@@ -144,17 +207,48 @@ class NtagInterface(PyDlpRfid2):
     if not (0x0 <= byte <= 0x3): return self.logger.error("invalid byte index")
     return response[byte * 2 : (byte * 2) + 2]
 
+  def snapshot(self, names=None, max_age=None):
+    """ Return a RegisterSnapshot holding the blocks of the registers and
+    configs names (all the registers by default)
+
+    Each distinct block is read once. Blocks of the previous snapshot
+    younger than max_age (self.snapshot_max_age by default) are reused.
+    """
+    if names is None: names = NTAG5_REGISTERS.keys()
+    if max_age is None: max_age = self.snapshot_max_age
+    addresses = []
+    for name in names:
+      entry = NTAG5_REGISTERS.get(name) or NTAG5_CONFIG[name]
+      if entry["address"] not in addresses: addresses.append(entry["address"])
+    previous = self._snapshot
+    if previous is not None and previous.age <= max_age:
+      blocks = dict(previous.blocks)
+      timestamp = previous.timestamp
+    else:
+      blocks = {}
+      timestamp = time.monotonic()
+    for address in addresses:
+      if address in blocks: continue
+      self.logger.debug(f"Reading block {address:02X}")
+      try:
+        blocks[address] = self.read_config_block(address)
+      except StandardError as exc:
+        self.logger.error(f"failed to get memory block: {exc}")
+        blocks[address] = None
+    self._snapshot = RegisterSnapshot(blocks, timestamp)
+    return self._snapshot
+
+  def invalidate_snapshot(self):
+    # The next snapshot reads the tag again
+    self._snapshot = None
+
   def get_register_bit(self, register, bit_mask):
     self.logger.debug(f"Reading register {register}, {bit_mask}")
-    register_byte  = self.get_memory_byte(NTAG5_REGISTERS[register]["address"], NTAG5_REGISTERS[register]["byte"])
-    if register_byte == None: return None
-    return int(register_byte, 16) & NTAG5_REGISTERS[register][bit_mask]
+    return self.snapshot((register,)).register_bit(register, bit_mask)
 
   def get_config_bit(self, config, bit_mask):
     self.logger.debug(f"Reading config {config}, {bit_mask}")
-    config_byte  = self.get_memory_byte(NTAG5_CONFIG[config]["address"], NTAG5_CONFIG[config]["byte"])
-    if config_byte == None: return None
-    return int(config_byte, 16) & NTAG5_CONFIG[config][bit_mask]
+    return self.snapshot((config,)).config_bit(config, bit_mask)
 
   def set_memory_block(self, address, value):
     self.logger.debug(f"Writing memory @ {address} with {value}")
@@ -166,6 +260,7 @@ class NtagInterface(PyDlpRfid2):
                                 flags=flagsbyte(),
                                 command_code=NTAG5_CMD["WRITE_CONF"]["code"],
                                 data = f"{address:02X}{data_inverse}")
+    self.invalidate_snapshot()
     if (len(response) <= 0): self.logger.error("failed to set memory block")
 
   # def set_memory_byte(address, byte, value):
@@ -181,72 +276,48 @@ class NtagInterface(PyDlpRfid2):
   # def set_memory_bit(address, byte, bite, value):
   #   # todo
 
+  def read_sram_blocks(self, address, count, chunk_blocks=16):
+    # Read count SRAM blocks from address, chunk_blocks blocks per READ_SRAM
+    data = bytearray()
+    while count > 0:
+      n = min(count, chunk_blocks)
+      resp = self.tag_command(flagsbyte(), NTAG5_CMD["READ_SRAM"]["code"], bytes((address, n - 1)))
+      data += resp.payload[:n*4]
+      address += n
+      count -= n
+    return bytes(data)
+
+  def write_sram_blocks(self, address, data, chunk_blocks=16):
+    # Write data, padded to whole blocks, to the SRAM from address
+    if len(data) % 4: data = bytes(data) + bytes(4 - len(data) % 4)
+    data = memoryview(data)
+    for i in range(0, len(data), chunk_blocks * 4):
+      chunk = data[i:i + chunk_blocks*4]
+      self.tag_command(flagsbyte(), NTAG5_CMD["WRITE_SRAM"]["code"],
+                       bytes((address + i//4, len(chunk)//4 - 1)) + chunk)
+
   def read_sram(self):
+    # Return the message the MCU left in the SRAM: length in byte 0, data
+    # from block 1. Reading the last block hands the SRAM back to the MCU.
     self.logger.debug(f"Reading sram")
-    response_1 = []
-    response_2 = []
-    response_3 = []
-    response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(),
-                                command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                data = f"{NTAG5_ADDR['SRAM_START']['address']:02X}{'00'}")
-    if(len(response)>0):
-      length = int(response[0][2:4], 16)/4
-      length = math.ceil(length)
-    else:
-      return print("error reading header")
-
-    if length > 15:
-      response_1 = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                  flags=flagsbyte(),
-                                  command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                  data = f"{(NTAG5_ADDR['SRAM_START']['address'])+1:02X}{'15'}")
-      length = length - 15
-      if length > 15:
-        response_2 = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                    flags=flagsbyte(),
-                                    command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                    data = f"{(NTAG5_ADDR['SRAM_START']['address'])+1+15:02X}{'15'}")
-        length = length - 15
-        if length > 0:
-          response_3 = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                      flags=flagsbyte(),
-                                      command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                      data = f"{(NTAG5_ADDR['SRAM_START']['address'])+1+15:02X}{length:02X}")
-      else:
-        response_2 = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                    flags=flagsbyte(),
-                                    command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                    data = f"{(NTAG5_ADDR['SRAM_START']['address'])+1+15:02X}{length:02X}")
-    else:
-      response_1 = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                  flags=flagsbyte(),
-                                  command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                  data = f"{(NTAG5_ADDR['SRAM_START']['address'])+1:02X}{length:02X}")
-    if len(response_1) > 0:
-      print(bytes.fromhex(response_1[0]).decode("utf-8"))
-    if len(response_2) > 0:
-      print(bytes.fromhex(response_2[0]).decode("utf-8"))
-    if len(response_3) > 0:
-      print(bytes.fromhex(response_3[0]).decode("utf-8"))
-    self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(),
-                                command_code=NTAG5_CMD["READ_SRAM"]["code"],
-                                data = f"{NTAG5_ADDR['SRAM_END']['address']:02X}{'00'}")
+    self.invalidate_snapshot()  # reading the last block clears SRAM_DATA_RDY
+    header = self.read_sram_blocks(NTAG5_ADDR['SRAM_START']['address'], 1)
+    if header[0] > (NTAG5_ADDR['SRAM_END']['address'] - NTAG5_ADDR['SRAM_START']['address']) * 4:
+      # Hand the SRAM back anyway, the MCU would wait for it
+      self.read_sram_blocks(NTAG5_ADDR['SRAM_END']['address'], 1)
+      raise StandardError(f"SRAM message length {header[0]} past the SRAM end")
+    length = math.ceil(header[0] / 4)
+    data = self.read_sram_blocks(NTAG5_ADDR['SRAM_START']['address'] + 1, length)
+    if NTAG5_ADDR['SRAM_START']['address'] + length < NTAG5_ADDR['SRAM_END']['address']:
+      self.read_sram_blocks(NTAG5_ADDR['SRAM_END']['address'], 1)
+    return data[:header[0]]
 
   def write_sram(self, data):
-    data_str = ''.join(f'{byte:02X}' for byte in data)
-    size = (len(data_str)//8)-1
-    size_str = f'{size:02X}'
-    self.logger.debug(f"Writing sram with: {data_str} length: {size_str}+1")
-    response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(),
-                                command_code=NTAG5_CMD["WRITE_SRAM"]["code"],
-                                data = f"{NTAG5_ADDR['SRAM_START']['address']:02X}{size_str}{data_str}")
-    response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(),
-                                command_code=NTAG5_CMD["WRITE_SRAM"]["code"],
-                                data = f"{NTAG5_ADDR['SRAM_END']['address']:02X}{'00'}{'FFFFFFFF'}")
+    # Write data from block 0 then the last block to hand the SRAM over to the MCU
+    self.invalidate_snapshot()
+    self.logger.debug(f"Writing sram with: {bytes(data).hex()}")
+    self.write_sram_blocks(NTAG5_ADDR['SRAM_START']['address'], bytes(data))
+    self.write_sram_blocks(NTAG5_ADDR['SRAM_END']['address'], b'\xFF\xFF\xFF\xFF')
 
   def discover(self):
     self.logger.debug(f"Looking for ntag")
@@ -284,10 +355,11 @@ class NtagInterface(PyDlpRfid2):
 
   def get_data_direction(self):
     self.logger.debug(f"Reading configured data direction")
-    i2c_if_locked = self.get_register_bit("STATUS_1_REG", "I2C_IF_LOCKED_mask")
-    nfc_if_locked = self.get_register_bit("STATUS_1_REG", "NFC_IF_LOCKED_mask")
-    pt_xfer_dir   = self.get_register_bit("CONFIG_1_REG", "PT_TRANSFER_DIR_mask")
-    ed_config     = self.get_register_bit("ED_CONFIG_REG", "ED_CONFIG_mask")
+    registers = self.snapshot(("STATUS_1_REG", "CONFIG_1_REG", "ED_CONFIG_REG"))
+    i2c_if_locked = registers.register_bit("STATUS_1_REG", "I2C_IF_LOCKED_mask")
+    nfc_if_locked = registers.register_bit("STATUS_1_REG", "NFC_IF_LOCKED_mask")
+    pt_xfer_dir   = registers.register_bit("CONFIG_1_REG", "PT_TRANSFER_DIR_mask")
+    ed_config     = registers.register_bit("ED_CONFIG_REG", "ED_CONFIG_mask")
     self.logger.debug(F"i2c_if_locked {i2c_if_locked}, nfc_if_locked {nfc_if_locked}, pt_xfer_dir {pt_xfer_dir}, ed_config {ed_config}")
     if pt_xfer_dir == 0x0 and ed_config == 0x3: return "I2C_NFC"
     if pt_xfer_dir == 0x1 and ed_config == 0x4: return "NFC_I2C"
@@ -325,14 +397,14 @@ class NtagInterface(PyDlpRfid2):
 
   def state_i2c_nfc_dir(self):
     # print("..................running state i2c->nfc", end='\r')
-    if time.perf_counter() - self.start_time > 5:  sys.exit(1)
     if self.get_data_direction()  != "I2C_NFC": return print("waiting for mcu to switch data direction", end='\r')
     if self.get_sram_data_ready() != 32:        return
     self.logger.debug(f"sram is written by mcu, reading")
     message = self.read_sram()
     if self.get_sram_data_ready() == 32:        return print(f"...... failed to read SRAM, trying again", end='\r')
+    print(message.decode("utf-8", "replace"))
     self.app_state = "state_nfc_i2c_direction"
-    sys.exit(0)
+    self.finish(0)
 
   def state_nfc_i2c_dir(self):
     self.logger.debug(f"Running nfc_i2c direction state")
@@ -346,7 +418,11 @@ class NtagInterface(PyDlpRfid2):
 
   def default_state(self):
     self.logger.error("unexpteced state, error")
-    sys.exit(1)
+    self.finish(1)
+
+  def finish(self, code):
+    # End the application with exit code
+    self.exit_code = code
 
   state_machine = {
     "state_trigger_energy_harvest": state_trigger_eh,
@@ -356,12 +432,197 @@ class NtagInterface(PyDlpRfid2):
     "state_default":                default_state
   }
 
-def start_application(argv):
-    ntag = NtagInterface()
+class PassThroughError(StandardError):
+  pass
+
+class SramChannel(object):
+  """ Messages of any size over the NTAG5 SRAM pass-through
+
+  A message is cut in fragments sent one SRAM handover each. Block 0 of
+  the SRAM holds the fragment length, flags (SRAM_MORE when fragments
+  follow) and a sequence number, the fragment data follows from block 1.
+  The side writing waits for PT_TRANSFER_DIR to point its way and for
+  SRAM_DATA_RDY to be clear, the side reading for SRAM_DATA_RDY to be set.
+  Writing, or reading, the last SRAM block hands the SRAM over.
+  """
+
+  SRAM_BLOCKS = NTAG5_ADDR['SRAM_END']['address'] - NTAG5_ADDR['SRAM_START']['address'] + 1
+  FRAGMENT_SIZE = (SRAM_BLOCKS - 1) * 4
+  SRAM_MORE = 0x01
+
+  def __init__(self, ntag, timeout=5.0, chunk_blocks=16, min_interval=0.002, max_interval=0.05):
+    """ timeout bounds each wait for the MCU, chunk_blocks the blocks per
+    READ_SRAM/WRITE_SRAM, the registers are polled between min_interval and
+    max_interval apart
+    """
+    self.ntag = ntag
+    self.timeout = timeout
+    self.chunk_blocks = chunk_blocks
+    self.min_interval = min_interval
+    self.max_interval = max_interval
+    self.sequence = 0
+    self.size = 0
+    self.elapsed = 0.0
+
+  @property
+  def rate(self):
+    # bytes per second of the last message
+    if self.elapsed == 0: return 0.0
+    return self.size / self.elapsed
+
+  def wait(self, register, mask, value, what):
+    # Poll register until its mask bits are value
+    self.wait_for(lambda: bool(self.ntag.get_register_bit(register, mask)) == value, what)
+
+  def wait_for(self, condition, what):
+    # Poll the registers until condition() is true
+    deadline = time.monotonic() + self.timeout
+    interval = self.min_interval
+    while True:
+      self.ntag.invalidate_snapshot()
+      if condition(): return
+      if time.monotonic() > deadline:
+        raise PassThroughError(f"Timeout waiting for {what}")
+      time.sleep(interval)
+      interval = min(interval * 2, self.max_interval)
+
+  def send(self, data):
+    """ Send data to the MCU, return once the MCU got the last fragment """
+    start = time.monotonic()
+    data = bytes(data)
+    self.wait("CONFIG_1_REG", "PT_TRANSFER_DIR_mask", True, "NFC to I2C direction")
+    offset = 0
+    while True:
+      fragment = data[offset:offset + self.FRAGMENT_SIZE]
+      offset += len(fragment)
+      flags = self.SRAM_MORE if offset < len(data) else 0
+      self.wait("STATUS_0_REG", "SRAM_DATA_RDY_mask", False, "the MCU to read the SRAM")
+      frame = bytes((len(fragment), flags, self.sequence, 0)) + fragment
+      if len(frame) % 4: frame += bytes(4 - len(frame) % 4)
+      self.ntag.write_sram_blocks(NTAG5_ADDR['SRAM_START']['address'], frame, self.chunk_blocks)
+      if len(frame) < self.SRAM_BLOCKS * 4:
+        self.ntag.write_sram_blocks(NTAG5_ADDR['SRAM_END']['address'], bytes(4))
+      self.sequence = (self.sequence + 1) & 0xFF
+      if not flags: break
+    # An MCU answering at once turns PT_TRANSFER_DIR to I2C to NFC and
+    # sets SRAM_DATA_RDY again before it is seen clear
+    self.wait_for(lambda: not self.ntag.get_register_bit("STATUS_0_REG", "SRAM_DATA_RDY_mask")
+                  or not self.ntag.get_register_bit("CONFIG_1_REG", "PT_TRANSFER_DIR_mask"),
+                  "the MCU to read the SRAM")
+    self.ntag.invalidate_snapshot()
+    self.size = len(data)
+    self.elapsed = time.monotonic() - start
+    return self.size
+
+  def receive(self):
+    """ Return the next message of the MCU as bytes """
+    start = time.monotonic()
+    self.wait("CONFIG_1_REG", "PT_TRANSFER_DIR_mask", False, "I2C to NFC direction")
+    message = bytearray()
+    sequence = None
+    while True:
+      self.wait("STATUS_0_REG", "SRAM_DATA_RDY_mask", True, "a message from the MCU")
+      # The header and the first data come in the same read
+      first = min(self.chunk_blocks, self.SRAM_BLOCKS)
+      frame = self.ntag.read_sram_blocks(NTAG5_ADDR['SRAM_START']['address'], first, self.chunk_blocks)
+      length, flags, number = frame[0], frame[1], frame[2]
+      if length > self.FRAGMENT_SIZE:
+        raise PassThroughError(f"Fragment length {length} too large")
+      if sequence is not None and number != (sequence + 1) & 0xFF:
+        raise PassThroughError(f"Fragment {number} received after {sequence}")
+      sequence = number
+      blocks = 1 + math.ceil(length / 4)
+      if blocks > first:
+        frame += self.ntag.read_sram_blocks(NTAG5_ADDR['SRAM_START']['address'] + first,
+                                            blocks - first, self.chunk_blocks)
+      if max(first, blocks) < self.SRAM_BLOCKS:
+        self.ntag.read_sram_blocks(NTAG5_ADDR['SRAM_END']['address'], 1)
+      message += frame[4:4 + length]
+      if not flags & self.SRAM_MORE: break
+    self.ntag.invalidate_snapshot()
+    self.size = len(message)
+    self.elapsed = time.monotonic() - start
+    return bytes(message)
+
+class StateScheduler(object):
+  """ Run the NtagInterface state machine, polling the tag with adaptive intervals
+
+  The next state is run min_interval after a transition, the interval
+  then grows by backoff up to max_interval while the state does not
+  change. deadlines maps a state to the seconds it may last, after which
+  on_timeout(state) is called: it returns the next state, or None to
+  finish with exit code 1. on_transition(old, new) is called on each state
+  change and on_exit(code) when the state machine finishes.
+  """
+
+  # The MCU gets 5 s to hand over its message after the connection
+  DEADLINES = {"state_i2c_nfc_direction": 5.0}
+
+  def __init__(self, ntag, min_interval=0.005, max_interval=0.5, backoff=2.0,
+               deadlines=None, on_transition=None, on_timeout=None, on_exit=None):
+    self.ntag = ntag
+    self.min_interval = min_interval
+    self.max_interval = max_interval
+    self.backoff = backoff
+    self.deadlines = self.DEADLINES if deadlines is None else deadlines
+    self.on_transition = on_transition
+    self.on_timeout = on_timeout
+    self.on_exit = on_exit
+    self.interval = min_interval
+    self.entered = time.monotonic()
+    self.steps = 0
+
+  def transition(self, old, new):
+    self.entered = time.monotonic()
+    self.interval = self.min_interval
+    if self.on_transition is not None: self.on_transition(old, new)
+
+  def step(self):
+    """ Run the current state once, return the delay before the next step,
+    None once finished
+    """
+    ntag = self.ntag
+    state = ntag.app_state
+    deadline = self.deadlines.get(state)
+    if deadline is not None and time.monotonic() - self.entered > deadline:
+      logger.error(f"{state} timed out after {deadline}s")
+      new_state = self.on_timeout(state) if self.on_timeout is not None else None
+      if new_state is None:
+        ntag.finish(1)
+      else:
+        ntag.app_state = new_state
+    else:
+      ntag.invalidate_snapshot()  # registers are read once per poll cycle
+      ntag.state_machine.get(state, NtagInterface.default_state)(ntag)
+      self.steps += 1
+    if ntag.exit_code is not None:
+      if self.on_exit is not None: self.on_exit(ntag.exit_code)
+      return None
+    if ntag.app_state != state:
+      self.transition(state, ntag.app_state)
+    else:
+      self.interval = min(self.interval * self.backoff, self.max_interval)
+    return self.interval
 
+  def run(self):
+    """ Run until the state machine finishes, return the exit code """
+    while True:
+      delay = self.step()
+      if delay is None: return self.ntag.exit_code
+      time.sleep(delay)
+
+  async def run_async(self, executor=None):
+    """ run() for asyncio, the reader I/O running in executor """
+    import asyncio
+    loop = asyncio.get_running_loop()
     while True:
-      state_method = ntag.state_machine.get(ntag.app_state, ntag.default_state)(ntag)
-      time.sleep(0.5)
+      delay = await loop.run_in_executor(executor, self.step)
+      if delay is None: return self.ntag.exit_code
+      await asyncio.sleep(delay)
+
+def start_application(argv):
+    ntag = NtagInterface()
+    sys.exit(StateScheduler(ntag).run())
 
 if __name__ == "__main__":
     start_application(sys.argv[1:])
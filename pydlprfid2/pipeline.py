@@ -0,0 +1,158 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Pipelined EVM command submission
+#
+# Instead of a strict write/read round trip per command, up to depth frames
+# are kept in flight: queued frames are coalesced in one serial write, and
+# replies are matched to their frames in order. A reply is delimited by its
+# expected payloads, or by the echo of the following frame. The queue tops
+# the pipeline up in one write once half of the frames in flight are
+# answered.
+#
+# A reply not complete in time fails its future, and the ones of the frames
+# in flight behind it, with ReaderTimeoutError: their replies are drained
+# with the end of the late one.
+#
+#   with reader.pipeline(depth=16) as pipe:
+#       futures = [pipe.submit_iso15693(...) for ...]
+#   results = [f.result() for f in futures]
+
+import time
+import collections
+from concurrent.futures import Future
+
+from .pydlprfid2 import (ResponseParser, ReaderTimeoutError, build_frame, build_request,
+                         reply_end, DLP_CMD)
+
+
+class PendingCommand(object):
+    """ One queued EVM frame and the future of its reply """
+
+    __slots__ = ('frame', 'expect', 'lines', 'full', 'future')
+
+    def __init__(self, frame, expect, full):
+        self.frame = frame
+        self.lines = None
+        if expect is None:
+            expect, self.lines = reply_end(frame)
+        self.expect = expect
+        self.full = full
+        self.future = Future()
+
+
+class Pipeline(object):
+
+    def __init__(self, reader, depth=8):
+        if depth < 1:
+            raise ValueError("Pipeline depth can't be 0 or less")
+        self.reader = reader
+        self.depth = depth
+        self.queue = collections.deque()
+        self.inflight = collections.deque()
+        self.completed = 0
+        self.writes = 0
+        self.elapsed = 0.0
+
+    def submit(self, cmd, prms='', expect=None, get_full_response=False):
+        """ Queue an EVM command, return a Future of its response
+
+        The future resolves to the same value issue_evm_command() returns.
+        """
+        return self.submit_frame(build_frame(cmd, prms), expect, get_full_response)
+
+    def submit_frame(self, frame, expect=None, get_full_response=False):
+        """ Queue a frame from build_frame(), return a Future of its response """
+        pending = PendingCommand(frame, expect, get_full_response)
+        self.queue.append(pending)
+        return pending.future
+
+    def submit_iso15693(self, cmd, flags='', command_code='', data='', expect=None):
+        """ Queue a command like issue_iso15693_command() does """
+        if cmd == DLP_CMD["REQUESTCMD"]["code"]:
+            if command_code > 0x2C:
+                data = "04"+data #add manuf_code to command data
+            if expect is None:
+                expect = 1  # tag answer, '[]' if none
+        return self.submit(cmd, flags + '%02X'%command_code + data, expect=expect)
+
+    def submit_request(self, flags, command_code, data=b''):
+        """ Queue an ISO15693 request with data bytes, like tag_command()
+        without retry. The future resolves to the full response, to give
+        to parse_tag_answer().
+        """
+        return self.submit_frame(build_request(flags, command_code, data), 1, True)
+
+    @property
+    def commands_per_sec(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.completed / self.elapsed
+
+    def _fill(self):
+        if len(self.inflight) > self.depth // 2:
+            return
+        frames = []
+        while self.queue and len(self.inflight) < self.depth:
+            pending = self.queue.popleft()
+            self.inflight.append(pending)
+            frames.append(pending.frame)
+        if frames:
+            self.reader.write(b''.join(frames))
+            self.writes += 1
+
+    def _complete_one(self):
+        pending = self.inflight.popleft()
+        # Without a known end, use the echo of the next frame as reply
+        # delimiter when it is on its way, otherwise the quiet time ends
+        # the reply.
+        until = self.inflight[0].frame if self.inflight else None
+        parser = self.reader.receive(ResponseParser(pending.expect, until,
+                                                    pending.lines, pending.frame))
+        if parser.timed_out:
+            # receive() drained the input, the replies to the frames in
+            # flight are lost with this one. The next frames resynchronize
+            # on their echo.
+            pending.future.set_exception(ReaderTimeoutError(
+                "Reply not complete after {:.1f}s".format(self.reader.READ_TIMEOUT)))
+            for lost in self.inflight:
+                lost.future.set_exception(ReaderTimeoutError(
+                    "Reply lost with the one of a previous command"))
+            self.inflight.clear()
+            return
+        response = bytes(parser.buf)
+        self.reader.logger.debug('RETR%3d: %r', len(response)/2, response)
+        if pending.full:
+            pending.future.set_result(response)
+        else:
+            pending.future.set_result(self.reader.get_response(response))
+        self.completed += 1
+
+    def flush(self):
+        """ Send every queued command and wait for all the replies """
+        start = time.monotonic()
+        try:
+            while self.queue or self.inflight:
+                self._fill()
+                self._complete_one()
+        except Exception as exc:
+            for pending in list(self.inflight) + list(self.queue):
+                pending.future.set_exception(exc)
+            self.inflight.clear()
+            self.queue.clear()
+            raise
+        finally:
+            self.elapsed += time.monotonic() - start
+
+    def run(self, commands):
+        """ Issue a list of (cmd, prms) in pipeline, return their responses """
+        futures = [self.submit(cmd, prms) for cmd, prms in commands]
+        self.flush()
+        return [future.result() for future in futures]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Pool of DLP-RFID2 readers, one per serial port
+#
+# Each reader gets its own worker thread, serial I/O releases the GIL so
+# scatter/gather operations scale with the number of ports:
+#
+#   pool = ReaderPool(['/dev/ttyUSB0', '/dev/ttyUSB1'])
+#   tags = pool.merged_inventory()      # uid -> [(port, rssi, latency), ...]
+#   port, data, latency = pool.read_multiple_block(uid, 4, 0)
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .pydlprfid2 import PyDlpRfid2, ISO15693
+
+
+class ReaderResult(object):
+    """ Outcome of one operation on one reader of the pool """
+
+    __slots__ = ('port', 'value', 'error', 'latency')
+
+    def __init__(self, port, value=None, error=None, latency=0.0):
+        self.port = port
+        self.value = value
+        self.error = error
+        self.latency = latency
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<ReaderResult {} error {!r} ({:.3f}s)>'.format(self.port, self.error, self.latency)
+        return '<ReaderResult {} {!r} ({:.3f}s)>'.format(self.port, self.value, self.latency)
+
+
+class ReaderPool(object):
+
+    def __init__(self, serial_ports, protocol=ISO15693, internal=False,
+                 loglevel=logging.INFO, reader_class=PyDlpRfid2):
+        self.ports = list(serial_ports)
+        self.readers = {}
+        self.locks = {port: threading.Lock() for port in self.ports}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.ports)),
+                                           thread_name_prefix='dlprfid2')
+        def open_reader(port):
+            # Kept at once, to be closed if another port fails to open
+            self.readers[port] = reader_class(serial_port=port, loglevel=loglevel)
+        self._check(self._gather(self.ports, open_reader))
+        self._check(self.initialize(protocol, internal))
+
+    def _check(self, results):
+        # Close the pool and raise the error of a reader that failed
+        for port, result in results.items():
+            if result.error is not None:
+                self.close()
+                raise result.error
+
+    def initialize(self, protocol=ISO15693, internal=False):
+        """ Set protocol and antenna on every reader in parallel """
+        def init(reader):
+            reader.set_protocol(protocol)
+            reader.enable_external_antenna()
+            if internal:
+                reader.enable_internal_antenna()
+        return self.scatter(init)
+
+    def _run(self, port, func):
+        start = time.monotonic()
+        try:
+            value = func(port)
+        except Exception as exc:
+            return ReaderResult(port, error=exc, latency=time.monotonic() - start)
+        return ReaderResult(port, value, latency=time.monotonic() - start)
+
+    def _gather(self, ports, func):
+        futures = [self.executor.submit(self._run, port, func) for port in ports]
+        return {result.port: result for result in (f.result() for f in futures)}
+
+    def _call(self, func, args, kwargs):
+        # func is a PyDlpRfid2 method name or a callable taking the reader
+        def call(port):
+            reader = self.readers[port]
+            with self.locks[port]:
+                if callable(func):
+                    return func(reader, *args, **kwargs)
+                return getattr(reader, func)(*args, **kwargs)
+        return call
+
+    def scatter(self, func, *args, ports=None, **kwargs):
+        """ Run func on every reader (or on ports) concurrently
+
+        Return a dict port -> ReaderResult, exceptions are kept in the
+        result instead of being raised.
+        """
+        return self._gather(self.ports if ports is None else ports,
+                            self._call(func, args, kwargs))
+
+    def first(self, func, *args, ports=None, **kwargs):
+        """ Run func on every reader, return the first result not None
+
+        Return None if no reader gave a result.
+        """
+        call = self._call(func, args, kwargs)
+        futures = [self.executor.submit(self._run, port, call)
+                   for port in (self.ports if ports is None else ports)]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.error is None and result.value is not None:
+                return result
+        return None
+
+    def inventory(self, **kwargs):
+        """ Inventory on all readers, return a dict port -> ReaderResult """
+        return self.scatter('inventory', **kwargs)
+
+    def merged_inventory(self, **kwargs):
+        """ Complete inventory on all readers
+
+        Return a dict uid -> [(port, rssi, latency), ...], latency the
+        duration of the inventory on port.
+        """
+        tags = {}
+        for port, result in self.scatter('inventory_all', **kwargs).items():
+            if result.error is not None:
+                continue
+            for uid, rssi in result.value:
+                tags.setdefault(uid, []).append((port, rssi, result.latency))
+        return tags
+
+    def read_multiple_block(self, uid, blocknum, blockoffset):
+        """ Read blocks of uid from whichever reader sees it
+
+        Return (port, data, latency) or None if no reader answered.
+        """
+        result = self.first('eeprom_read_multiple_block', uid, blocknum, blockoffset)
+        if result is None:
+            return None
+        return result.port, result.value, result.latency
+
+    def close(self):
+        for reader in self.readers.values():
+            reader.close()
+        self.readers = {}
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
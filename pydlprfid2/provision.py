@@ -0,0 +1,177 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Mass provisioning: the same image written to every tag in the field
+#
+# All the tags are inventoried, then the image is written to each of them
+# in addressed mode, in one session. Writes are interleaved, block i of
+# every tag before block i+1, and pipelined. ISO15693 is half duplex and the
+# reader issues one command at a time, so the EEPROM programming of a tag
+# does not overlap other tags traffic: only the serial transfer and the
+# host time of the next frames do.
+#
+#   report = reader.provision(image)
+#   for result in report:
+#       print(result.uid, result.ok, result.verified)
+#   print(report.tags_per_minute)
+
+import time
+
+from .pydlprfid2 import (StandardError, NTAG5_CMD, VERIFY_BLOCK, VERIFY_DEFERRED,
+                         VERIFY_NONE, VERIFY_POLICIES, flagsbyte, uid_bytes, parse_tag_answer)
+
+
+class ProvisionResult(object):
+    """ Outcome of the provisioning of one tag
+
+    verified is True when the image was read back, False when it differs,
+    None when the verify policy does not read back. error is the message
+    of the failure, None on success.
+    """
+
+    __slots__ = ('uid', 'rssi', 'blocks', 'verified', 'error')
+
+    def __init__(self, uid, rssi=''):
+        self.uid = uid
+        self.rssi = rssi
+        self.blocks = 0
+        self.verified = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<ProvisionResult {} {} blocks, {}>'.format(
+                self.uid, self.blocks, 'ok' if self.ok else self.error)
+
+
+class ProvisionReport(object):
+    """ Provisioning of the tags in the field, iterates on the ProvisionResult """
+
+    __slots__ = ('results', 'inventory', 'elapsed')
+
+    def __init__(self, results=None, inventory=None, elapsed=0.0):
+        self.results = [] if results is None else results
+        self.inventory = inventory
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def tags_per_minute(self):
+        if self.elapsed == 0:
+            return 0.0
+        return len(self.succeeded) * 60 / self.elapsed
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return '<ProvisionReport {} tags, {} failed, {:.3f}s ({:.1f} tags/min)>'.format(
+                len(self.results), len(self.failed), self.elapsed, self.tags_per_minute)
+
+
+def provision(reader, image, offset=0, verify=VERIFY_DEFERRED, tags=None, depth=8, rows=8):
+    """ Write image, bytes of a multiple of 4 size, from block offset of
+    every tag in the field
+
+    tags is a list of (uid, rssi) to provision instead of the inventory.
+    Writes are submitted rows blocks at a time on a pipeline of depth
+    commands. A failed write is retried alone with the reader retry
+    policy, a tag still failing is left out of the following writes.
+    Return a ProvisionReport.
+    """
+    if verify not in VERIFY_POLICIES:
+        raise StandardError("Unknown verify policy {}".format(verify))
+    if len(image) % 4:
+        raise StandardError("Image size is not a multiple of the block size")
+    start = time.monotonic()
+    inventory = None
+    if tags is None:
+        inventory = reader.inventory_all()
+        tags = inventory.tags
+    report = ProvisionReport([ProvisionResult(uid, rssi) for uid, rssi in tags], inventory)
+    image = memoryview(image)
+    blocknum = len(image) // 4
+    write_flags = flagsbyte(address=True, protocol_extension=True)
+    write_code = NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"]
+    read_code = NTAG5_CMD["READ_MULTIPLE_BLOCK"]["code"]
+    active = list(report.results)
+    with reader.pipeline(depth=depth) as pipe:
+        for first in range(0, blocknum, rows):
+            last = min(first + rows, blocknum)
+            submitted = []
+            for i in range(first, last):
+                block = offset + i
+                address = bytes((block & 0xFF, (block >> 8) & 0xFF))
+                value = image[i*4:i*4 + 4]
+                for result in active:
+                    prefix = uid_bytes(result.uid)
+                    write = pipe.submit_request(write_flags, write_code, prefix + address + value)
+                    read = None
+                    if verify == VERIFY_BLOCK:
+                        read = pipe.submit_request(write_flags, read_code, prefix + address + b'\x00')
+                    submitted.append((result, block, value, write, read))
+            pipe.flush()
+            for result, block, value, write, read in submitted:
+                if not result.ok:
+                    continue
+                try:
+                    data = _check_write(reader, result.uid, block, value, write, read)
+                except Exception as exc:
+                    reader.logger.warning('Provisioning %s failed on block %d: %s',
+                                          result.uid, block, exc)
+                    result.error = str(exc)
+                    continue
+                if data is not None and data != value:
+                    result.error = ("Write error on block {}: read {} instead of {}"
+                                    .format(block, data.hex().upper(), value.hex().upper()))
+                    result.verified = False
+                    continue
+                result.blocks += 1
+            active = [result for result in active if result.ok]
+    for result in active:
+        if verify == VERIFY_BLOCK:
+            result.verified = True
+        elif verify == VERIFY_DEFERRED:
+            try:
+                reader.eeprom_verify_blocks(result.uid, offset, image)
+            except Exception as exc:
+                result.error = str(exc)
+                result.verified = False
+            else:
+                result.verified = True
+    report.elapsed = time.monotonic() - start
+    reader.logger.debug('Provisioning: %r', report)
+    return report
+
+
+def _check_write(reader, uid, block, value, write, read):
+    # Return the block read back after the pipelined write of value, None
+    # without read. A failed command is issued again alone, raise if it
+    # still fails.
+    try:
+        parse_tag_answer(write.result())
+    except StandardError as exc:
+        reader.logger.debug('Write of block %d on %s failed (%s), retrying', block, uid, exc)
+        reader.write_blocks(uid, block, value, VERIFY_NONE)
+        if read is None:
+            return None
+        return reader.read_blocks(uid, block, 1)
+    if read is None:
+        return None
+    try:
+        return bytes(parse_tag_answer(read.result()).payload[:4])
+    except StandardError:
+        return reader.read_blocks(uid, block, 1)
@@ -1,28 +1,67 @@
 # -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
 # vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
 
-import re
 import time
-import serial
-import pprint
 import logging
 import binascii
+import functools
 
-try:
+# serial, termcolor and pprint are imported when first needed, the CLI
+# starts faster without them.
+
+def colored(msg, *args, **kwargs):
     # Use colored logging if termcolor is available
-    from termcolor import colored
-except ImportError:
-    # But just pass through the message if not
-    def colored(msg, *args, **kwargs):
-        return msg
+    global colored
+    try:
+        from termcolor import colored
+    except ImportError:
+        # But just pass through the message if not
+        def colored(msg, *args, **kwargs):
+            return msg
+    return colored(msg, *args, **kwargs)
+
+from .retry import RetryPolicy
+from .trace import SEND, RECV
 
 class StandardError(Exception):
     pass
 
+class NoResponseError(StandardError):
+    """ No tag answered the request (RF dropout, tag out of the field) """
+    retryable = True
+
+class ReaderTimeoutError(NoResponseError):
+    """ The reader reply did not complete before the read deadline """
+
+class CollisionError(StandardError):
+    """ Garbled tag answer: collision or RF CRC error """
+    retryable = True
+
+class TagError(StandardError):
+    """ The tag answered with the ISO15693 error flag and an error code """
+
+    def __init__(self, code, resp):
+        self.code = code
+        super().__init__("Wrong code return {} ({}): {}".format(
+            resp[0:2], resp, ISO15693_ERRORS.get(code, {"desc": "Unknown error"})["desc"]))
+
+    @property
+    def retryable(self):
+        return ISO15693_ERRORS.get(self.code, {"retry": False})["retry"]
+
+class LockedBlockError(TagError):
+    """ The block is locked """
+
 ISO15693 = 'ISO15693'
 ISO14443A = 'ISO14443A'
 ISO14443B = 'ISO14443B'
 
+# Write verification policies
+VERIFY_BLOCK = 'block'          # read back each block after writing it
+VERIFY_DEFERRED = 'deferred'    # read back the whole range once at the end
+VERIFY_NONE = 'none'            # only check that the tag answered
+VERIFY_POLICIES = (VERIFY_BLOCK, VERIFY_DEFERRED, VERIFY_NONE)
+
 # sloa157.pdf Table 4 «HOST (PC GUI to MCU)» page 18
 DLP_CMD = {
         "DIRECTMODE":   {"code": '0F', "desc": "Direct mode"},
@@ -88,6 +127,19 @@ NTAG5_CMD = {
         "WRITE_SRAM":               {"code": 0xD3, "desc": "Write SRAM"},
         }
 
+# ISO15693 error codes, datasheet m24lr64e-r.pdf table 56
+ISO15693_ERRORS = {
+        0x01: {"retry": False, "desc": "Command not supported"},
+        0x02: {"retry": False, "desc": "Command not recognized"},
+        0x03: {"retry": False, "desc": "Option not supported"},
+        0x0F: {"retry": True,  "desc": "Error with no information given"},
+        0x10: {"retry": False, "desc": "Block not available"},
+        0x11: {"retry": False, "desc": "Block already locked"},
+        0x12: {"retry": False, "desc": "Block locked, content can't be changed"},
+        0x13: {"retry": True,  "desc": "Block not successfully programmed"},
+        0x14: {"retry": True,  "desc": "Block not successfully locked"},
+        }
+
 NTAG5_ADDR = {
         "SRAM_START":   {"address": 0x00, "desc": "First address of SRAM"},
         "SRAM_END":     {"address": 0x3F, "desc": "Last address of SRAM"},
@@ -97,6 +149,7 @@ NTAG5_ADDR = {
         "ED_CONFIG_REG":{"address": 0xA8, "desc": "Event Detection Config Register"},
         }
 
+@functools.lru_cache(maxsize=4096)
 def reverse_uid(uid):
     if len(uid) != 16:
         raise Exception(f"Wrong uid size {len(uid)}, should be 16")
@@ -109,6 +162,7 @@ def reverse_uid(uid):
             uid[-14:-12] +
             uid[-16:-14])
 
+@functools.lru_cache(maxsize=None)
 def flagsbyte(double_sub_carrier=False, high_data_rate=False, inventory=False,
               protocol_extension=False, afi=False, single_slot=False,
               option=False, select=False, address=False):
@@ -129,22 +183,450 @@ def flagsbyte(double_sub_carrier=False, high_data_rate=False, inventory=False,
     bits += '1' if double_sub_carrier else '0'  # bit 1
     return '%02X' % int(bits, 2)     # return hex byte
 
+# The EVM protocol has a general form as shown below:
+#  1. SOF (Start of File): 0x01
+#  2. LENGTH : Two bytes define the number of bytes in the frame including SOF. Least Significant Byte first!
+#  3. READER_TYPE : 0x03
+#  4. ENTITY : 0x04
+#  5. CMD : The command
+#  6. PRMS : Parameters
+#  7. EOF : 0x0000
+
+# Frame bytes besides PRMS: SOF, LENGTH, READER_TYPE, ENTITY, CMD, EOF
+FRAME_OVERHEAD = 8
+FRAME_EOF = b'0000'
+
+@functools.lru_cache(maxsize=None)
+def frame_header(cmd, size):
+    # SOF, LENGTH (LSB first), READER_TYPE, ENTITY and CMD of a frame with
+    # size bytes of parameters
+    length = size + FRAME_OVERHEAD
+    return ('01%02X%02X0304%s' % (length & 0xFF, length >> 8, cmd)).upper().encode('ascii')
+
+def build_frame(cmd, prms=''):
+    # Return the frame of cmd with prms, the ASCII bytes written to the reader
+    prms = prms.upper().encode('ascii')
+    return frame_header(cmd, len(prms) >> 1) + prms + FRAME_EOF
+
+@functools.lru_cache(maxsize=1024)
+def request_prefix(flags, command_code):
+    # REQUESTCMD parameters before the data: flags, command code and the
+    # manufacturer code of custom commands
+    prefix = flags + '%02X' % command_code
+    if command_code > 0x2C:
+        prefix += "04"
+    return prefix.upper().encode('ascii')
+
+def build_request(flags, command_code, data=b''):
+    # Return the REQUESTCMD frame sending command_code with flags, a
+    # flagsbyte() string, and data bytes
+    prms = request_prefix(flags, command_code) + binascii.hexlify(data).upper()
+    return frame_header(DLP_CMD["REQUESTCMD"]["code"], len(prms) >> 1) + prms + FRAME_EOF
+
+# Line ends closing the replies without bracketed payload, echo included:
+# the register write and banners are printed after an empty line, the
+# antenna, AGC, AM/PM and LED commands only echo.
+REPLY_LINES = {
+        DLP_CMD["WRITESINGLE"]["code"]: 3,
+        DLP_CMD["INTERNANT"]["code"]: 1,
+        DLP_CMD["EXTERNANT"]["code"]: 1,
+        DLP_CMD["AGCSEL"]["code"]: 1,
+        DLP_CMD["AMPMSEL"]["code"]: 1,
+        DLP_CMD["VERSION"]["code"]: 3,
+        DLP_CMD["INITIALIZE"]["code"]: 3,
+}
+REPLY_LINES.update((DLP_CMD[name]["code"], 1) for name in DLP_CMD
+                   if name.startswith(("SETLED", "CLRLED")))
+# flagsbyte() single_slot bit
+ISO15693_SINGLE_SLOT = 0x20
+
+def reply_end(frame):
+    # Return (payloads, line ends) completing the reply to frame, the
+    # payloads counted when the command prints some
+    cmd = frame[10:12].decode('ascii')
+    if cmd == DLP_CMD["REQUESTCMD"]["code"]:
+        return 1, None      # tag answer, '[]' if none
+    if cmd == DLP_CMD["ANTICOL15693"]["code"]:
+        return (1 if int(frame[12:14], 16) & ISO15693_SINGLE_SLOT else 16), None
+    if cmd == DLP_CMD["READSINGLE"]["code"]:
+        return (len(frame) - 16) // 2, None     # one per register read
+    return None, REPLY_LINES.get(cmd)
+
+def build_frames(commands):
+    # Return the frames of a sequence of (cmd, prms), to issue_frame() or
+    # submit_frame() on a pipeline
+    return [build_frame(cmd, prms) for cmd, prms in commands]
+
+# TRF7970A registers
+CHIP_STATUS_CONTROL = 0x00  # 0x21 for full power, 0x31 for half power
+ISO_CONTROL = 0x01
+CHIP_STATUS_FULL_POWER = 0x21
+ISO_CONTROL_VALUES = {
+    ISO15693: 0x00,   # 0x01 for 1-out-of-256 modulation
+    ISO14443A: 0x09,
+    ISO14443B: 0x0C,
+}
+AGC_ENABLE = '00'
+AM_INPUT = 'FF'
+
+class ChipState(object):
+    """ Shadow of the reader configuration: TRF7970A registers written,
+    antenna, AGC and AM/PM selection
+
+    None, or a register missing, is unknown. Only the commands needed to
+    go from the shadow state to the one requested are sent, an unknown
+    state is always set.
+    """
+
+    __slots__ = ('initialized', 'registers', 'antenna', 'agc', 'ampm')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.initialized = False
+        self.registers = {}
+        self.antenna = None
+        self.agc = None
+        self.ampm = None
+
+    def protocol_commands(self, protocol=ISO15693):
+        """ Return the (cmd, prms) still needed to configure protocol """
+        commands = []
+        if not self.initialized:
+            commands.append((DLP_CMD["INITIALIZE"]["code"], ''))
+            registers = {}
+        else:
+            registers = self.registers
+        wanted = ((CHIP_STATUS_CONTROL, CHIP_STATUS_FULL_POWER),
+                  (ISO_CONTROL, ISO_CONTROL_VALUES[protocol]))
+        prms = ''.join('%02X%02X' % (reg, value) for reg, value in wanted
+                       if registers.get(reg) != value)
+        if prms:
+            commands.append((DLP_CMD["WRITESINGLE"]["code"], prms))
+        if not self.initialized or self.agc != AGC_ENABLE:
+            commands.append((DLP_CMD["AGCSEL"]["code"], AGC_ENABLE))
+        if not self.initialized or self.ampm != AM_INPUT:
+            commands.append((DLP_CMD["AMPMSEL"]["code"], AM_INPUT))
+        return commands
+
+    def antenna_commands(self, antenna):
+        """ Return the (cmd, prms) still needed to select antenna,
+        DLP_CMD["EXTERNANT"] or DLP_CMD["INTERNANT"] code
+        """
+        if self.antenna == antenna:
+            return []
+        return [(antenna, '')]
+
+    def update(self, cmd, prms):
+        """ Record the effect of the command cmd sent with success """
+        if cmd == DLP_CMD["INITIALIZE"]["code"]:
+            self.reset()
+            self.initialized = True
+        elif cmd == DLP_CMD["WRITESINGLE"]["code"]:
+            for i in range(0, len(prms) - 3, 4):
+                self.registers[int(prms[i:i+2], 16)] = int(prms[i+2:i+4], 16)
+        elif cmd in (DLP_CMD["EXTERNANT"]["code"], DLP_CMD["INTERNANT"]["code"]):
+            self.antenna = cmd
+        elif cmd == DLP_CMD["AGCSEL"]["code"]:
+            self.agc = prms
+        elif cmd == DLP_CMD["AMPMSEL"]["code"]:
+            self.ampm = prms
+
+def uid_data(uid, data):
+    # Prefix request data with the tag uid (LSB first) for addressed mode.
+    # Return the address flag and the data.
+    if uid is None:
+        return False, data
+    return True, reverse_uid(uid) + data
+
+@functools.lru_cache(maxsize=4096)
+def uid_bytes(uid):
+    # The uid as sent in addressed mode (LSB first), empty if uid is None
+    if uid is None:
+        return b''
+    return bytes.fromhex(reverse_uid(uid))
+
+def block_payload(resp, size=None):
+    # Return the data following the response flags of a tag answer
+    if resp[0:2] != '00':
+        raise StandardError("Wrong code return {} ({})".format(resp[0:2], resp))
+    if size is None:
+        return resp[2:]
+    return resp[2:2 + size*2]
+
+def write_block_data(block_offset, datastr):
+    # Return the WRITE_SINGLE_BLOCK data for datastr hex value at block_offset
+    if len(datastr) > 8:
+        raise StandardError("Data too long")
+    try:
+        datavalue = "{:08X}".format(int(datastr, 16))
+    except ValueError:
+        raise StandardError("Data is not correct hexadecimal value")
+    return "%02X%02X" % (block_offset&0xff, (block_offset>>8)&0xff) + datavalue
+
+def response_groups(response):
+    # Return the bracketed payloads of a raw reply, as bytes
+    groups = []
+    start = response.find(b'[')
+    while start >= 0:
+        end = response.find(b']', start + 1)
+        if end < 0:
+            break
+        groups.append(response[start + 1:end])
+        start = response.find(b'[', end + 1)
+    return groups
+
+def response_payloads(response):
+    # Return the bracketed payloads of a raw reply
+    return [group.decode('ascii') for group in response_groups(response)]
+
+def parse_tag_answer(response, timed_out=False):
+    # Return the TagResponse of a raw REQUESTCMD reply, raise the classified
+    # error if there is no answer or it is an error
+    groups = response_groups(response)
+    if not groups:
+        if timed_out:
+            raise ReaderTimeoutError("Reader reply not complete")
+        raise NoResponseError("No reply from reader")
+    if len(groups) != 1 or not groups[0]:
+        raise NoResponseError("No tag answer")
+    try:
+        answer = binascii.unhexlify(groups[0])
+    except ValueError:
+        raise CollisionError("Garbled tag answer ({})".format(groups[0].decode('ascii', 'replace')))
+    if answer[0] & 0x01:
+        code = answer[1] if len(answer) >= 2 else None
+        if code in (0x11, 0x12):
+            raise LockedBlockError(code, groups[0].decode('ascii'))
+        raise TagError(code, groups[0].decode('ascii'))
+    return TagResponse(answer[0], memoryview(answer)[1:])
+
+def inventory_uids(response):
+    # Return the (uid, rssi) tuples found in an inventory response, in slot order
+    uids = []
+    for itm in response:
+        itm = itm.split(',')
+        if len(itm[0]) == 16:
+            uids.append((itm[0], itm[1]))
+    return uids
+
+
+class TagResponse(object):
+    """ Tag answer: response flags, the payload following them as a
+    memoryview and the duration of the request in seconds
+    """
+
+    __slots__ = ('flags', 'payload', 'elapsed')
+
+    def __init__(self, flags, payload, elapsed=0.0):
+        self.flags = flags
+        self.payload = payload
+        self.elapsed = elapsed
+
+    def hex(self):
+        # The answer as the reader prints it
+        return '%02X' % self.flags + self.payload.hex().upper()
+
+    def __repr__(self):
+        return '<TagResponse flags {:02X}, {} bytes, {:.1f}ms>'.format(
+                self.flags, len(self.payload), self.elapsed * 1000)
+
+
+class InventoryReport(object):
+    """ Tags found by a complete inventory, iterates on (uid, rssi) """
+
+    __slots__ = ('tags', 'rounds', 'collisions', 'elapsed')
+
+    def __init__(self, tags=None, rounds=0, collisions=0, elapsed=0.0):
+        self.tags = [] if tags is None else tags
+        self.rounds = rounds
+        self.collisions = collisions
+        self.elapsed = elapsed
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __repr__(self):
+        return '<InventoryReport {} tags, {} rounds, {:.3f}s>'.format(
+                len(self.tags), self.rounds, self.elapsed)
+
+
+class TransferReport(object):
+    """ Size and duration of a bulk EEPROM transfer """
+
+    __slots__ = ('blocks', 'elapsed')
+
+    def __init__(self, blocks=0, elapsed=0.0):
+        self.blocks = blocks
+        self.elapsed = elapsed
+
+    @property
+    def size(self):
+        return self.blocks * 4
+
+    @property
+    def rate(self):
+        # bytes per second
+        if self.elapsed == 0:
+            return 0.0
+        return self.size / self.elapsed
+
+    def __repr__(self):
+        return '<TransferReport {} bytes in {:.3f}s ({:.0f} B/s)>'.format(
+                self.size, self.elapsed, self.rate)
+
+
+class DeltaReport(object):
+    """ Blocks written and skipped by a differential write """
+
+    __slots__ = ('written', 'skipped', 'ranges', 'elapsed')
+
+    def __init__(self, written=None, skipped=None, ranges=None, elapsed=0.0):
+        self.written = [] if written is None else written
+        self.skipped = [] if skipped is None else skipped
+        self.ranges = [] if ranges is None else ranges
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<DeltaReport {} written, {} skipped in {} ranges, {:.3f}s>'.format(
+                len(self.written), len(self.skipped), len(self.ranges), self.elapsed)
+
+
+class ResponseParser(object):
+    """ Incremental parser for one DLP-RFID2 reply
+
+    The firmware echoes the received frame then prints text lines and
+    bracketed payloads '[...]', each line ended by CRLF. With echo, the
+    frame sent, what comes before its echo is left of an older reply and
+    dropped. With expect set, the reply is complete on the line end
+    following the expect-th payload, with lines on the lines-th line end.
+    Without them, the caller ends the reply where the echo of the next
+    frame (until) starts when commands are pipelined, or on a quiet line
+    end past the echo line.
+    """
+
+    def __init__(self, expect=None, until=None, lines=None, echo=None):
+        self.expect = expect
+        self.until = until
+        self.lines = lines
+        self.echo = echo
+        self.buf = bytearray()
+        self.groups = 0
+        self.dropped = 0
+        self.done = False
+        self.timed_out = False
+        self._lines = 0
+        self._scan = 0
+
+    @property
+    def quiet_end(self):
+        # True when silence from now on ends the reply. The echo comes
+        # before the RF exchange, silence after it is no end.
+        buf = self.buf
+        return (self.expect is None and self.lines is None and self.echo is None
+                and buf.endswith(b'\n') and buf.find(b'\n') < len(buf) - 1)
+
+    def feed(self, data):
+        """ Consume data, return the bytes found past the end of the reply """
+        self.buf += data
+        if self.done:
+            return b''
+        buf = self.buf
+        if self.echo is not None:
+            start = buf.find(self.echo)
+            if start < 0:
+                # Keep what may be the beginning of the echo
+                start = max(0, len(buf) - len(self.echo) + 1)
+            else:
+                self.echo = None
+            self.dropped += start
+            del buf[:start]
+            if self.echo is not None:
+                return b''
+        if self.expect is None:
+            if self.lines is not None:
+                while self._lines < self.lines:
+                    eol = buf.find(b'\n', self._scan)
+                    if eol < 0:
+                        self._scan = len(buf)
+                        return b''
+                    self._lines += 1
+                    self._scan = eol + 1
+                self.done = True
+                rest = bytes(buf[self._scan:])
+                del buf[self._scan:]
+                return rest
+            if self.until is None:
+                return b''
+            start = buf.find(b'\n')
+            if start < 0:
+                return b''
+            end = buf.find(self.until, start)
+            if end < 0:
+                return b''
+            self.done = True
+            rest = bytes(buf[end:])
+            del buf[end:]
+            return rest
+        while self.groups < self.expect:
+            end = buf.find(b']', self._scan)
+            if end < 0:
+                self._scan = len(buf)
+                return b''
+            self.groups += 1
+            self._scan = end + 1
+        eol = buf.find(b'\n', self._scan)
+        if eol < 0:
+            self._scan = len(buf)
+            return b''
+        self.done = True
+        rest = bytes(buf[eol + 1:])
+        del buf[eol + 1:]
+        return rest
+
 
 class PyDlpRfid2(object):
     BAUDRATE=115200
-    STOP_BITS=serial.STOPBITS_ONE
-    PARITY=serial.PARITY_NONE
-    BYTESIZE=serial.EIGHTBITS
-
-    def __init__(self, serial_port, loglevel=logging.INFO):
+    STOP_BITS=1     # serial.STOPBITS_ONE
+    PARITY='N'      # serial.PARITY_NONE
+    BYTESIZE=8      # serial.EIGHTBITS
+    # A reply without expected payload is over after this much silence
+    # following a line end. Also used as the serial poll timeout.
+    QUIET_TIME=0.02
+    # Hard deadline for one reply, only reached if the reply never completes
+    READ_TIMEOUT=1.0
+    # M24LR64E-R: 2048 blocks of 4 bytes, a READ_MULTIPLE_BLOCK can't cross
+    # a 32 blocks sector boundary.
+    EEPROM_BLOCKS=2048
+    SECTOR_BLOCKS=32
+
+    def __init__(self, serial_port, loglevel=logging.INFO, retry_policy=None,
+                 transport=None):
+        # transport replaces the serial port, a trace.ReplaySerial for instance
         self.protocol = None
+        # Never retry by default. The policy is the reader's own, its
+        # counters are not shared with other readers.
+        self.retry_policy = RetryPolicy(max_attempts=1) if retry_policy is None else retry_policy
+        self.timed_out = False
+        self.metrics = None
+        self.trace = None
+        self.chip = ChipState()
+        self._rxrest = b''
         self.__log_config(loglevel)
-        self.sp = serial.Serial(port=serial_port,
-                                baudrate=self.BAUDRATE,
-                                stopbits=self.STOP_BITS,
-                                parity=self.PARITY,
-                                bytesize=self.BYTESIZE,
-                                timeout=0.1)
+        if transport is not None:
+            self.sp = transport
+        else:
+            import serial
+            self.sp = serial.Serial(port=serial_port,
+                                    baudrate=self.BAUDRATE,
+                                    stopbits=self.STOP_BITS,
+                                    parity=self.PARITY,
+                                    bytesize=self.BYTESIZE,
+                                    timeout=self.QUIET_TIME)
 
         if not self.sp:
             raise StandardError('Could not connect to serial port ' + serial_port)
@@ -154,30 +636,38 @@ class PyDlpRfid2(object):
 
     def __log_config(self, loglevel):
         self.logger = logging.getLogger(__name__)
-        # create console handler and set level to debug
-        ch = logging.StreamHandler()
-        ch.setLevel(loglevel)
-        # create formatter
-        formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
-        # add formatter to ch
-        ch.setFormatter(formatter)
-
-        # add ch to logger
-        self.logger.addHandler(ch)
+        if not self.logger.handlers:
+            # create console handler, once for every reader sharing the
+            # logger, the logger level filters the messages
+            ch = logging.StreamHandler()
+            # create formatter
+            formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+            # add formatter to ch
+            ch.setFormatter(formatter)
+
+            # add ch to logger
+            self.logger.addHandler(ch)
         self.logger.setLevel(loglevel)
 
 
+    def configure(self, commands):
+        # Send configuration commands, keeping self.chip up to date
+        for cmd, prms in commands:
+            self.issue_evm_command(cmd=cmd, prms=prms)
+            if self.timed_out:
+                self.chip.reset()
+            else:
+                self.chip.update(cmd, prms)
+
     def enable_external_antenna(self):
-        cmdstr = DLP_CMD["EXTERNANT"]["code"]
-        self.issue_evm_command(cmd=cmdstr)
+        self.configure(self.chip.antenna_commands(DLP_CMD["EXTERNANT"]["code"]))
 
     def enable_internal_antenna(self):
-        cmdstr = DLP_CMD["INTERNANT"]["code"]
-        self.issue_evm_command(cmd=cmdstr)
+        self.configure(self.chip.antenna_commands(DLP_CMD["INTERNANT"]["code"]))
 
     def init_kit(self):
         initcmd = DLP_CMD["INITIALIZE"]["code"]
-        self.issue_evm_command(cmd=initcmd)  # Should return "TRF7970A EVM"
+        self.configure([(initcmd, '')])  # Should return "TRF7970A EVM"
 
     def debug_test(self):
         print("DEBUG TEST:")
@@ -209,46 +699,21 @@ class PyDlpRfid2(object):
 
         print("")
         print("End of debug")
+        self.chip.reset()
 
     def set_iso15693(self):
         # Select protocol: 15693 with full power
-        self.issue_evm_command(cmd=DLP_CMD["WRITESINGLE"]["code"],
-                               prms='00210100')
+        self.configure([(DLP_CMD["WRITESINGLE"]["code"], '00210100')])
 
-    def set_protocol(self, protocol=ISO15693):
+    def set_protocol(self, protocol=ISO15693, force=False):
+        # Only the commands changing the reader state are sent, see
+        # ChipState. force sends them all, when the reader may have been
+        # configured behind our back.
 
         self.protocol = protocol
-
-        # 1. Initialize reader: 0xFF
-        # 0108000304 FF 0000
-        initcmd = DLP_CMD["INITIALIZE"]["code"]
-        self.issue_evm_command(cmd=initcmd)  # Should return "TRF7970A EVM"
-
-        # self.issue_evm_command(cmd='10', prms='0121')
-        # self.issue_evm_command(cmd='10', prms='0021')
-
-        # Select protocol: 15693 with full power
-        self.issue_evm_command(cmd=DLP_CMD["WRITESINGLE"]["code"],
-                               prms='00210100')
-
-        # Setting up registers:
-        #   0x00 Chip Status Control: Set to 0x21 for full power, 0x31 for half power
-        #   0x01 ISO Control: Set to 0x00 for ISO15693, 0x09 for ISO14443A, 0x0C for ISO14443B
-        protocol_values = {
-            ISO15693: '00',   # 01 for 1-out-of-256 modulation
-            ISO14443A: '09',
-            ISO14443B: '0C',
-        }
-        self.issue_evm_command(cmd=DLP_CMD["WRITESINGLE"]["code"],
-                               prms='0021' + '01' + protocol_values[protocol])
-
-        # 3. AGC selection (0xF0) : AGC enable (0x00)
-        # 0109000304 F0 00 0000
-        self.issue_evm_command(cmd=DLP_CMD["AGCSEL"]["code"], prms='00')
-
-        # 4. AM/PM input selection (0xF1) : AM input (0xFF)
-        # 0109000304 F1 FF 0000
-        self.issue_evm_command(cmd=DLP_CMD['AMPMSEL']["code"], prms='FF')
+        if force:
+            self.chip.reset()
+        self.configure(self.chip.protocol_commands(protocol))
 
     def enable_led(self, led_no):
         cmd_codes = {2: 'FB', 3: 'F9', 4: 'F7', 5: 'F5', 6: 'F3'}
@@ -297,21 +762,71 @@ class PyDlpRfid2(object):
     def inventory_iso15693(self, single_slot=False):
         # Command code 0x01: ISO 15693 Inventory request
         # Example: 010B000304 14 24 0100 0000
+        # The firmware prints one payload per slot, 1 or 16.
         response = self.issue_iso15693_command(cmd=DLP_CMD["ANTICOL15693"]["code"],
                                                flags=flagsbyte(inventory=True,
                                                                single_slot=single_slot),
                                                command_code=NTAG5_CMD["INVENTORY"]["code"],
-                                               data='00')
-        for itm in response:
-            itm = itm.split(',')
-            if itm[0] == 'z':
-                self.logger.debug('Tag conflict!')
-            else:
-                if len(itm[0]) == 16:
-                    uid = itm[0]
-                    rssi = itm[1]
-                    self.logger.debug('Found tag: %s (%s) ', uid, rssi)
-                    return uid, rssi
+                                               data='00',
+                                               expect=1 if single_slot else 16)
+        if any(itm.split(',')[0] == 'z' for itm in response):
+            self.logger.debug('Tag conflict!')
+        for uid, rssi in inventory_uids(response):
+            self.logger.debug('Found tag: %s (%s) ', uid, rssi)
+            return uid, rssi
+
+    def inventory_all(self, **kwargs):
+        if self.protocol == ISO15693:
+            return self.inventory_iso15693_all(**kwargs)
+        start = time.monotonic()
+        ret = self.inventory(**kwargs)
+        tags = [] if ret is None else [(ret, '')]
+        return InventoryReport(tags, 1, 0, time.monotonic() - start)
+
+    def inventory_iso15693_slots(self, mask_length=0, mask=0):
+        # 16 slots inventory of the tags whose uid ends with the mask_length
+        # lower bits of mask. The mask is sent LSB first.
+        # Example: 010C000304 14 04 01 04 03 0000  (slots for uids ending by 3)
+        maskbytes = (mask_length + 7) // 8
+        data = '%02X' % mask_length + ''.join('%02X' % ((mask >> (8*i)) & 0xFF)
+                                              for i in range(maskbytes))
+        return self.issue_iso15693_command(cmd=DLP_CMD["ANTICOL15693"]["code"],
+                                           flags=flagsbyte(inventory=True),
+                                           command_code=NTAG5_CMD["INVENTORY"]["code"],
+                                           data=data, expect=16)
+
+    def inventory_iso15693_all(self):
+        """ Return every ISO15693 tag in the field as an InventoryReport
+
+        Each 16 slots round gives one '[...]' per slot. A collision in a
+        slot ('z') is resolved by a new round restricted to the uids ending
+        with the slot number, recursively, until no collision is left.
+        """
+        start = time.monotonic()
+        tags = {}
+        rounds = 0
+        collisions = 0
+        masks = [(0, 0)]
+        while masks:
+            mask_length, mask = masks.pop()
+            response = self.inventory_iso15693_slots(mask_length, mask)
+            rounds += 1
+            for slot, itm in enumerate(response[:16]):
+                itm = itm.split(',')
+                if itm[0] == 'z':
+                    collisions += 1
+                    if mask_length + 4 < 64:
+                        masks.append((mask_length + 4, mask | (slot << mask_length)))
+                    else:
+                        self.logger.warning('Unresolved tag conflict, uid mask %016X', mask)
+                elif len(itm[0]) == 16:
+                    self.logger.debug('Found tag: %s (%s) ', itm[0], itm[1])
+                    tags[itm[0]] = itm[1]
+        report = InventoryReport(list(tags.items()), rounds, collisions,
+                                 time.monotonic() - start)
+        self.logger.debug('Inventory: %d tags, %d rounds, %d collisions in %.3fs',
+                          len(report), rounds, collisions, report.elapsed)
+        return report
 
     def get_dlp_rfid2_firmware_version(self):
         response = self.issue_evm_command(DLP_CMD["VERSION"]["code"], get_full_response=True)
@@ -319,133 +834,257 @@ class PyDlpRfid2(object):
 
 
     def eeprom_get_system_info(self, uid=None):
-        if uid is None:
-            response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(),
-                                command_code=NTAG5_CMD["GET_SYS_INFO"]["code"])
-        else:
-            response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                flags=flagsbyte(address=True),
+        address, data = uid_data(uid, '')
+        return self.tag_request(flags=flagsbyte(address=address),
                                 command_code=NTAG5_CMD["GET_SYS_INFO"]["code"],
-                                data=reverse_uid(uid))
-        if len(response) == 1 and response[0] != '':
-            return response[0]
-        else:
-            return None
+                                data=data)
 
 
     def eeprom_read_single_block(self, uid, blockoffset):
-        address = False
-        data='%02X%02X' % (blockoffset&0xFF, (blockoffset>>8)&0xFF)
-        if uid is not None:
-            data = reverse_uid(uid) + data
-            address = True
-        response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                           flags=flagsbyte(address=address, protocol_extension=True),
-                           command_code=NTAG5_CMD["READ_SINGLE_BLOCK"]["code"],
-                           data=data)
-        if len(response) == 1 and response[0] != '':
-            resp = response[0]
-            if resp[0:2] == '00':
-                return resp[2:10]
-            else:
-                raise StandardError("Wrong code return {} ({})".format(resp[0:2], resp))
-        else:
+        address, data = uid_data(uid, '%02X%02X' % (blockoffset&0xFF, (blockoffset>>8)&0xFF))
+        resp = self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                command_code=NTAG5_CMD["READ_SINGLE_BLOCK"]["code"],
+                                data=data)
+        if resp is None:
             return None
+        return block_payload(resp, 1*4)
 
     def eeprom_read_multiple_block(self, uid, blocknum, blockoffset):
-        address = False
         if blocknum < 1:
             raise Exception("Blocknum can't be 0 or less")
-        data='%02X%02X%02X' % (blockoffset&0xff, (blockoffset>>8)&0xff, blocknum-1)
-        if uid is not None:
-            address = True
-            data = reverse_uid(uid) + data
-        response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                    flags=flagsbyte(address=address, protocol_extension=True),
-                    command_code=NTAG5_CMD["READ_MULTIPLE_BLOCK"]["code"],
-                    data=data)
-        if len(response) == 1 and response[0] != '':
-            resp = response[0]
-            if resp[0:2] == '00':
-                return resp[2:]
-            else:
-                raise StandardError("Wrong code return {} ({})".format(resp[0:2], resp))
-        else:
+        address, data = uid_data(uid, '%02X%02X%02X' % (blockoffset&0xff, (blockoffset>>8)&0xff, blocknum-1))
+        resp = self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                command_code=NTAG5_CMD["READ_MULTIPLE_BLOCK"]["code"],
+                                data=data)
+        if resp is None:
             return None
+        return block_payload(resp)
 
     def eeprom_write_single_block(self, uid, block_offset, datastr, readback=True):
-        address = False
-        if len(datastr) > 8:
-            raise StandardError("Data too long")
-        try:
-            datavalue = "{:08X}".format(int(datastr, 16))
-        except ValueError:
-            raise StandardError("Data is not correct hexadecimal value")
-
-        data = "%02X%02X" % (block_offset&0xff, (block_offset>>8)&0xff) + datavalue
-        if uid is not None:
-            address = True
-            data = reverse_uid(uid) + data
-
-        response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                 flags=flagsbyte(address=address, protocol_extension=True),
-                 command_code=NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"],
-                 data=data)
+        address, data = uid_data(uid, write_block_data(block_offset, datastr))
+        resp = self.tag_request(flags=flagsbyte(address=address, protocol_extension=True),
+                                command_code=NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"],
+                                data=data)
         if readback:
             block_value = self.eeprom_read_single_block(uid, block_offset)
             if block_value != datastr:
                 raise Exception("Write error on block {}: read {} instead of {}"
                         .format(block_offset, block_value, datastr))
-        if len(response) == 1 and response[0] != '':
-            return response[0]
-        else:
-            return None
+        return resp
+
+    def eeprom_write_multiple_block(self, uid, block_offset, datalist, verify=VERIFY_BLOCK):
+        data = b''.join(value.to_bytes(4, 'big') for value in datalist)
+        return [resp.hex() for resp in self._write_blocks(uid, block_offset, data, verify)]
+
+    def write_blocks(self, uid, offset, data, verify=VERIFY_BLOCK):
+        """ Write data, bytes of a multiple of 4 size, from block offset
+
+        Each block is checked according to the verify policy. Return a
+        TransferReport.
+        """
+        start = time.monotonic()
+        self._write_blocks(uid, offset, data, verify)
+        return TransferReport(len(data) // 4, time.monotonic() - start)
+
+    def _write_blocks(self, uid, offset, data, verify):
+        # Return the TagResponse of each block write
+        if verify not in VERIFY_POLICIES:
+            raise StandardError("Unknown verify policy {}".format(verify))
+        if len(data) % 4:
+            raise StandardError("Data size is not a multiple of the block size")
+        data = memoryview(data)
+        flags = flagsbyte(address=uid is not None, protocol_extension=True)
+        prefix = uid_bytes(uid)
+        command_code = NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"]
+        responses = []
+        for i in range(0, len(data), 4):
+            block = offset + i // 4
+            value = data[i:i + 4]
+            responses.append(self.tag_command(flags, command_code,
+                                              prefix + bytes((block & 0xFF, (block >> 8) & 0xFF)) + value))
+            if verify == VERIFY_BLOCK:
+                read = self.read_blocks(uid, block, 1)
+                if read != value:
+                    raise Exception("Write error on block {}: read {} instead of {}"
+                            .format(block, read.hex().upper(), value.hex().upper()))
+        if verify == VERIFY_DEFERRED:
+            self.eeprom_verify_blocks(uid, offset, data)
+        return responses
+
+    def eeprom_write_delta(self, uid, block_offset, datalist, verify=VERIFY_DEFERRED):
+        """ Write only the blocks of datalist that differ from the tag content
+
+        The current content is read in bulk first, changed blocks are
+        written by contiguous ranges, each verified with verify policy.
+        Return a DeltaReport.
+        """
+        start = time.monotonic()
+        current = []
+        for offset, data in self.iter_blocks(uid, len(datalist), block_offset):
+            current.extend(int.from_bytes(data[i:i + 4], 'big') for i in range(0, len(data), 4))
+        report = DeltaReport()
+        first = None
+        for i, data in enumerate(datalist + [None]):
+            if data is not None and data == current[i]:
+                report.skipped.append(block_offset + i)
+                data = None
+            if data is None:
+                if first is not None:
+                    report.ranges.append((block_offset + first, i - first))
+                    first = None
+                continue
+            report.written.append(block_offset + i)
+            if first is None:
+                first = i
+        for offset, blocknum in report.ranges:
+            start_index = offset - block_offset
+            self.eeprom_write_multiple_block(uid, offset,
+                                             datalist[start_index:start_index + blocknum],
+                                             verify=verify)
+        report.elapsed = time.monotonic() - start
+        self.logger.debug('Delta write: %r', report)
+        return report
+
+    def eeprom_verify_blocks(self, uid, block_offset, expected):
+        """ Read back the blocks from block_offset and compare them to the
+        expected bytes, in as few READ_MULTIPLE_BLOCK as possible
+        """
+        expected = memoryview(expected)
+        blocknum = len(expected) // 4
+        for offset, data in self.iter_blocks(uid, blocknum, block_offset):
+            start = (offset - block_offset) * 4
+            if data == expected[start:start + len(data)]:
+                continue
+            for i in range(0, len(data), 4):
+                block_value = data[i:i + 4]
+                value = expected[start + i:start + i + 4]
+                if block_value != value:
+                    raise Exception("Write error on block {}: read {} instead of {}"
+                            .format(offset + i // 4, block_value.hex().upper(), value.hex().upper()))
+
+    def eeprom_read_blocks(self, uid, blocknum, blockoffset=0):
+        """ iter_blocks() yielding the data as hex strings """
+        for offset, data in self.iter_blocks(uid, blocknum, blockoffset):
+            yield offset, data.hex().upper()
+
+    def iter_blocks(self, uid, blocknum, blockoffset=0):
+        """ Read blocknum blocks with the largest requests the tag accepts
+
+        Yield (block offset, data) for each request, data a memoryview on
+        the answer. Requests stay in a sector. A request whose answer is
+        cut, garbled or too late for the reader is halved, the size grows
+        back after each success. Other errors, no tag or a tag error, are
+        raised as they are: a smaller request would fail the same way.
+        """
+        flags = flagsbyte(address=uid is not None, protocol_extension=True)
+        prefix = uid_bytes(uid)
+        command_code = NTAG5_CMD["READ_MULTIPLE_BLOCK"]["code"]
+        chunk = self.SECTOR_BLOCKS
+        offset = blockoffset
+        end = blockoffset + blocknum
+        while offset < end:
+            sector_end = (offset // self.SECTOR_BLOCKS + 1) * self.SECTOR_BLOCKS
+            count = min(chunk, end - offset, sector_end - offset)
+            try:
+                data = self.tag_command(flags, command_code,
+                                        prefix + bytes((offset & 0xFF, (offset >> 8) & 0xFF, count - 1))).payload
+                error = None
+                if len(data) < count*4:
+                    error = StandardError("Short answer reading {} blocks from {}: {} bytes"
+                                          .format(count, offset, len(data)))
+            except (ReaderTimeoutError, CollisionError) as exc:
+                error = exc
+            if error is not None:
+                if count == 1:
+                    raise error
+                chunk = max(1, count // 2)
+                self.logger.debug('Reading %d blocks failed (%s), trying %d', count, error, chunk)
+                continue
+            yield offset, data[:count*4]
+            offset += count
+            chunk = min(self.SECTOR_BLOCKS, chunk * 2)
+
+    def read_blocks(self, uid, offset, n):
+        """ Return n blocks from block offset as bytes """
+        data = bytearray()
+        for chunk_offset, chunk in self.iter_blocks(uid, n, offset):
+            data += chunk
+        return bytes(data)
+
+    def eeprom_dump(self, uid, fileobj, blocknum=None, blockoffset=0):
+        """ Write blocks of the tag as binary to fileobj
 
-    def eeprom_write_multiple_block(self, uid, block_offset, datalist):
-        offset = block_offset
-        resplist = []
-        for data in datalist:
-            resp = self.eeprom_write_single_block(uid, offset, "{:08X}".format(data))
-            offset = offset + 1
-            if resp is None:
-                raise StandardError("Writing error on data {:08X}".format(data))
-            resplist.append(resp)
-        return resplist
-
-    def write_blocks_to_card(self, uid, data_bytes, offset=0, nblocks=8):
+        The whole EEPROM by default. Return a TransferReport.
+        """
+        if blocknum is None:
+            blocknum = self.EEPROM_BLOCKS - blockoffset
+        start = time.monotonic()
+        for offset, data in self.iter_blocks(uid, blocknum, blockoffset):
+            fileobj.write(data)
+        report = TransferReport(blocknum, time.monotonic() - start)
+        self.logger.debug('Dump: %r', report)
+        return report
+
+    def eeprom_restore(self, uid, fileobj, blockoffset=0, verify=VERIFY_BLOCK):
+        """ Write the binary image read from fileobj to the tag
+
+        The image is streamed a sector at a time. Return a TransferReport.
+        """
+        if verify not in VERIFY_POLICIES:
+            raise StandardError("Unknown verify policy {}".format(verify))
+        start = time.monotonic()
+        offset = blockoffset
+        written = bytearray()
+        while True:
+            chunk = fileobj.read(self.SECTOR_BLOCKS * 4)
+            if not chunk:
+                break
+            if len(chunk) % 4:
+                raise StandardError("Image size is not a multiple of the block size")
+            self._write_blocks(uid, offset, chunk,
+                               VERIFY_NONE if verify == VERIFY_DEFERRED else verify)
+            if verify == VERIFY_DEFERRED:
+                written += chunk
+            offset += len(chunk) // 4
+        if verify == VERIFY_DEFERRED:
+            self.eeprom_verify_blocks(uid, blockoffset, written)
+        report = TransferReport(offset - blockoffset, time.monotonic() - start)
+        self.logger.debug('Restore: %r', report)
+        return report
+
+    def write_blocks_to_card(self, uid, data_bytes, offset=0, nblocks=8, retry=None):
+        # Only transient failures are retried, 10 attempts by default
+        if retry is None:
+            retry = RetryPolicy(max_attempts=10)
         for x in range(offset, nblocks):
-            success = False
-            attempts = 0
-            max_attempts = 10
-            while not success:
-                attempts += 1
-                success = self.write_block(uid, x, data_bytes[x*4:x*4+4])
-                if not success:
-                    self.logger.warn('Write failed, retrying')
-                    if attempts > max_attempts:
-                        self.logger.warn('Giving up!')
-                        return False
-                    # time.sleep(1.0)
+            try:
+                self.write_block(uid, x, data_bytes[x*4:x*4+4], retry=retry)
+            except StandardError as exc:
+                self.logger.warn('Giving up! %s', exc)
+                return False
         return True
 
     def erase_card(self, uid):
         data_bytes = ['00' for x in range(32)]
         return self.write_blocks_to_card(uid, data_bytes)
 
-    def write_block(self, uid, block_number, data):
+    def write_block(self, uid, block_number, data, retry=None):
+        # Return True on success. With a retry policy, failures are raised
+        # as classified errors once the policy gives up.
         if type(data) != list or len(data) != 4:
             raise StandardError('write_block got data of unknown type/length')
 
-        response = self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
-                                               flags=flagsbyte(address=True),  # 32 (dec) <-> 20 (hex)
-                                               command_code=NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"],
-                                               data='%s%02X%s' % (uid, block_number, ''.join(data)))
-        if response[0] == '00':
-            self.logger.debug('Wrote block %d successfully', block_number)
-            return True
-        else:
+        try:
+            self.iso15693_request(flags=flagsbyte(address=True),  # 32 (dec) <-> 20 (hex)
+                                  command_code=NTAG5_CMD["WRITE_SINGLE_BLOCK"]["code"],
+                                  data='%s%02X%s' % (uid, block_number, ''.join(data)),
+                                  retry=retry)
+        except StandardError:
+            if retry is not None:
+                raise
             return False
+        self.logger.debug('Wrote block %d successfully', block_number)
+        return True
 
     def unlock_afi(self, uid):
         self.issue_iso15693_command(cmd=DLP_CMD["REQUESTCMD"]["code"],
@@ -463,62 +1102,203 @@ class PyDlpRfid2(object):
                                     command_code=NTAG5_CMD["WRITE_AFI"]["code"],
                                     data='07')
 
-    def issue_evm_command(self, cmd, prms='', get_full_response=False):
-        # The EVM protocol has a general form as shown below:
-        #  1. SOF (Start of File): 0x01
-        #  2. LENGTH : Two bytes define the number of bytes in the frame including SOF. Least Significant Byte first!
-        #  3. READER_TYPE : 0x03
-        #  4. ENTITY : 0x04
-        #  5. CMD : The command
-        #  6. PRMS : Parameters
-        #  7. EOF : 0x0000
-
-        # Two-digit hex strings (without 0x prefix)
-        sof = '01'
-        reader_type = '03'
-        entity = '04'
-        eof = '0000'
-
-        result = reader_type + entity + cmd + prms + eof
-
-        length = int(len(result)/2) + 3  # Number of *bytes*, + 3 to include SOF and LENGTH
-        length = '%04X' % length  # Convert int to hex
-        length = binascii.unhexlify(length)[::-1]  # Reverse hex string to get LSB first
-        length = binascii.hexlify(length).decode('ascii')
-
-        result = sof + length + result
-        self.write(result.upper())
-        response = self.read()
+    def issue_evm_command(self, cmd, prms='', get_full_response=False, expect=None):
+        return self.issue_frame(build_frame(cmd, prms), get_full_response, expect)
+
+    def issue_frame(self, frame, get_full_response=False, expect=None):
+        # Send a frame from build_frame() and read its reply. expect is the
+        # number of bracketed payloads in the reply, the read returns as
+        # soon as they are received (see ResponseParser). Without it, the
+        # reply ends as reply_end() tells.
+        if self.metrics is not None:
+            return self._issue_frame_measured(frame, get_full_response, expect)
+        self.write(frame)
+        response = self.read(expect, frame)
         if get_full_response:
             return response
         else:
             return self.get_response(response)
 
-    def issue_iso15693_command(self, cmd, flags='', command_code='', data=''):
-        if cmd == DLP_CMD["REQUESTCMD"]["code"] and command_code > 0x2C:
-            data = "04"+data #add manuf_code to command data
-        return self.issue_evm_command(cmd, flags + '%02X'%command_code + data)
+    def _issue_frame_measured(self, frame, get_full_response, expect):
+        cmd = frame[10:12].decode('ascii')
+        start = time.perf_counter()
+        self.write(frame)
+        written = time.perf_counter()
+        response = self.read(expect, frame)
+        received = time.perf_counter()
+        if not get_full_response:
+            response = self.get_response(response)
+        end = time.perf_counter()
+        self.metrics.record_evm(cmd, end - start, written - start, received - written,
+                                end - received, error=self.timed_out)
+        return response
+
+    def enable_metrics(self, hook=None):
+        """ Start recording command metrics, return the CommandMetrics """
+        from .metrics import CommandMetrics
+        self.metrics = CommandMetrics(hook=hook)
+        return self.metrics
+
+    def disable_metrics(self):
+        self.metrics = None
+
+    def start_trace(self, path):
+        """ Record the frames sent and the bytes received to path """
+        from .trace import TraceRecorder
+        self.stop_trace()
+        self.trace = TraceRecorder(path)
+        return self.trace
+
+    def stop_trace(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def iso15693_request(self, flags, command_code, data='', retry=None):
+        """ tag_command() with hex string data, return the tag answer as a
+        hex string
+        """
+        return self.tag_command(flags, command_code, bytes.fromhex(data), retry).hex()
+
+    def tag_command(self, flags, command_code, data=b'', retry=None):
+        """ Send a REQUESTCMD with data bytes, return the TagResponse
+
+        Failures are raised classified (NoResponseError, ReaderTimeoutError,
+        CollisionError, TagError, LockedBlockError) after the retryable ones
+        were retried according to retry, self.retry_policy by default.
+        """
+        frame = build_request(flags, command_code, data)
+        attempts = [0]
+        def attempt():
+            if attempts[0]:
+                # The reply to the previous attempt may come late, it must
+                # not be taken for the answer to this one
+                self.drain()
+            attempts[0] += 1
+            start = time.perf_counter()
+            response = self.issue_frame(frame, get_full_response=True, expect=1)
+            resp = parse_tag_answer(response, self.timed_out)
+            resp.elapsed = time.perf_counter() - start
+            return resp
+        policy = self.retry_policy if retry is None else retry
+        if self.metrics is None:
+            return policy.call(attempt)
+        start = time.perf_counter()
+        try:
+            resp = policy.call(attempt)
+        except Exception:
+            self.metrics.record_iso15693(command_code, time.perf_counter() - start,
+                                         attempts[0] - 1, error=True)
+            raise
+        self.metrics.record_iso15693(command_code, time.perf_counter() - start,
+                                     attempts[0] - 1)
+        return resp
+
+    def tag_request(self, flags, command_code, data=''):
+        # iso15693_request() returning None if no tag answered
+        try:
+            return self.iso15693_request(flags, command_code, data)
+        except NoResponseError as exc:
+            self.logger.debug('%s', exc)
+            return None
+
+    def issue_iso15693_command(self, cmd, flags='', command_code='', data='', expect=None):
+        if cmd == DLP_CMD["REQUESTCMD"]["code"]:
+            if command_code > 0x2C:
+                data = "04"+data #add manuf_code to command data
+            if expect is None:
+                expect = 1  # tag answer, '[]' if none
+        return self.issue_evm_command(cmd, flags + '%02X'%command_code + data,
+                                      expect=expect)
 
     def flush(self):
+        self._rxrest = b''
         self.sp.readall()
 
-    def write(self, msg):
-        self.logger.debug('SEND%3d: ' % (len(msg)/2) +
-                          msg[0:2] +
-                          colored(msg[2:4], 'yellow') +
-                          msg[4:10] +
-                          colored(msg[10:12], 'red') +
-                          msg[12:-4] +
-                          colored(msg[-4:], 'green'))
-        self.sp.write(msg.encode('ascii'))
-
-    def read(self):
-        msg = self.sp.readall()
-        self.logger.debug('RETR%3d: ' % (len(msg)/2) + colored(pprint.saferepr(msg).strip("'"), 'cyan'))
+    def write(self, data):
+        # data is a frame from build_frame(), or frames joined
+        if self.logger.isEnabledFor(logging.DEBUG):
+            msg = data.decode('ascii')
+            self.logger.debug('SEND%3d: ' % (len(msg)/2) +
+                              msg[0:2] +
+                              colored(msg[2:4], 'yellow') +
+                              msg[4:10] +
+                              colored(msg[10:12], 'red') +
+                              msg[12:-4] +
+                              colored(msg[-4:], 'green'))
+        if self.trace is not None:
+            self.trace.record(SEND, data)
+        self.sp.write(data)
+
+    def read(self, expect=None, frame=None):
+        # Read the reply to frame, ended as reply_end() tells when expect
+        # is not given
+        lines = None
+        if frame is not None and expect is None:
+            expect, lines = reply_end(frame)
+        parser = self.receive(ResponseParser(expect, lines=lines, echo=frame))
+        if parser.dropped:
+            self.logger.debug('Dropped %d bytes of an older reply', parser.dropped)
+        self.timed_out = parser.timed_out
+        msg = bytes(parser.buf)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            import pprint
+            self.logger.debug('RETR%3d: ' % (len(msg)/2) + colored(pprint.saferepr(msg).strip("'"), 'cyan'))
         return msg
 
+    def receive(self, parser):
+        """ Feed the serial stream to parser until its reply is complete
+
+        Bytes received past the end of the reply are kept for the next one.
+        """
+        rest, self._rxrest = self._rxrest, b''
+        if rest:
+            self._rxrest = parser.feed(rest)
+        deadline = time.monotonic() + self.READ_TIMEOUT
+        while not parser.done:
+            chunk = self.sp.read(self.sp.in_waiting or 1)
+            if chunk:
+                if self.trace is not None:
+                    self.trace.record(RECV, chunk)
+                self._rxrest = parser.feed(chunk)
+            elif parser.quiet_end:
+                break
+            if time.monotonic() > deadline:
+                self.logger.warning('Reply not complete after %.1fs', self.READ_TIMEOUT)
+                parser.timed_out = True
+                self.drain()
+                break
+        return parser
+
+    def drain(self):
+        """ Discard the bytes received until the reader is quiet, what is
+        left of a reply given up
+        """
+        self._rxrest = b''
+        deadline = time.monotonic() + self.READ_TIMEOUT
+        while time.monotonic() < deadline:
+            chunk = self.sp.read(self.sp.in_waiting or 1)
+            if not chunk:
+                break
+            if self.trace is not None:
+                self.trace.record(RECV, chunk)
+            self.logger.debug('Drained %r', chunk)
+
     def get_response(self, response):
-        return re.findall(r'\[(.*?)\]', response.decode('ascii'))
+        return response_payloads(response)
+
+    def pipeline(self, depth=8):
+        """ Return a Pipeline submitting commands on this reader """
+        from .pipeline import Pipeline
+        return Pipeline(self, depth=depth)
+
+    def provision(self, image, offset=0, verify=VERIFY_DEFERRED, tags=None, depth=8):
+        """ Write image to every tag in the field, return a ProvisionReport
+        (see provision.provision())
+        """
+        from .provision import provision
+        return provision(self, image, offset, verify, tags, depth)
 
     def close(self):
+        self.stop_trace()
         self.sp.close()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Retry policy with jittered exponential backoff
+#
+# An error is retried when it has a true 'retryable' attribute, as the
+# classified reader errors of pydlprfid2 have: no answer from the tag,
+# reader timeout, collision or a transient ISO15693 error code. Errors such
+# as a locked block or an unsupported command are raised at once.
+#
+# A policy counts its calls, retries and failures: give each reader its
+# own, a reader without one gets a RetryPolicy(max_attempts=1) that only
+# classifies.
+#
+#   reader.retry_policy = RetryPolicy(max_attempts=5, budget=0.5)
+
+import time
+import random
+
+
+class RetryPolicy(object):
+
+    def __init__(self, max_attempts=3, base_delay=0.005, max_delay=0.2,
+                 jitter=1.0, budget=None):
+        """ Retry a call up to max_attempts times
+
+        The delay before the retry n is base_delay * 2**n, capped to
+        max_delay, of which a random fraction jitter is drawn. budget caps
+        the total time of one call, retries included.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts can't be 0 or less")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budget = budget
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def delay(self, retry):
+        delay = min(self.max_delay, self.base_delay * (2 ** retry))
+        return delay * (1.0 - self.jitter * random.random())
+
+    def call(self, func, *args, **kwargs):
+        """ Call func until it succeeds or fails with a final error """
+        self.calls += 1
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                if not getattr(exc, 'retryable', False) or attempt >= self.max_attempts:
+                    self.failures += 1
+                    raise
+                delay = self.delay(attempt - 1)
+                if self.budget is not None and time.monotonic() - start + delay > self.budget:
+                    self.failures += 1
+                    raise
+            self.retries += 1
+            time.sleep(delay)
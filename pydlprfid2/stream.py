@@ -0,0 +1,135 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Continuous inventory stream
+#
+# Inventories are run back to back and turned into tag events:
+#   ARRIVED  first time a tag is seen (or seen again after it departed)
+#   SEEN     tag still present, at most once per seen_interval
+#   DEPARTED tag not seen for absence_timeout seconds
+#
+#   stream = InventoryStream(reader, absence_timeout=0.5)
+#   for event in stream.events():
+#       print(event.kind, event.uid, event.rssi)
+#
+# The registry keeps one small record per tag present, ordered by last
+# sighting, so stale tags are found from its head and it never grows
+# beyond max_tags.
+
+import time
+import collections
+
+ARRIVED = 'arrived'
+SEEN = 'seen'
+DEPARTED = 'departed'
+
+
+class TagEvent(object):
+
+    __slots__ = ('kind', 'uid', 'rssi', 'timestamp')
+
+    def __init__(self, kind, uid, rssi, timestamp):
+        self.kind = kind
+        self.uid = uid
+        self.rssi = rssi
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return '<TagEvent {} {} rssi {:.1f}>'.format(self.kind, self.uid, self.rssi)
+
+
+class TagRecord(object):
+
+    __slots__ = ('rssi', 'first_seen', 'last_seen', 'last_report', 'count')
+
+    def __init__(self, rssi, now):
+        self.rssi = rssi
+        self.first_seen = now
+        self.last_seen = now
+        self.last_report = now
+        self.count = 1
+
+
+class InventoryStream(object):
+
+    def __init__(self, reader, absence_timeout=1.0, smoothing=0.3,
+                 seen_interval=None, max_tags=4096, scan=None):
+        """ Tag events from back to back inventories on reader
+
+        smoothing is the weight of a new RSSI sample in the smoothed value,
+        seen_interval the minimum time between two SEEN events of a tag
+        (None for no SEEN event), and scan a callable returning (uid, rssi)
+        tuples, reader.inventory_all by default.
+        """
+        self.reader = reader
+        self.absence_timeout = absence_timeout
+        self.smoothing = smoothing
+        self.seen_interval = seen_interval
+        self.max_tags = max_tags
+        self.scan = reader.inventory_all if scan is None else scan
+        self.tags = collections.OrderedDict()
+        self.scans = 0
+        self.running = False
+
+    def __contains__(self, uid):
+        return uid in self.tags
+
+    def __len__(self):
+        return len(self.tags)
+
+    def update(self, found, now=None):
+        """ Update the registry with one inventory, return the events """
+        if now is None:
+            now = time.monotonic()
+        events = []
+        tags = self.tags
+        for uid, rssi in found:
+            rssi = int(rssi, 16) if rssi else 0
+            record = tags.get(uid)
+            if record is None:
+                tags[uid] = TagRecord(rssi, now)
+                events.append(TagEvent(ARRIVED, uid, rssi, now))
+                continue
+            record.rssi += self.smoothing * (rssi - record.rssi)
+            record.last_seen = now
+            record.count += 1
+            tags.move_to_end(uid)
+            if self.seen_interval is not None and now - record.last_report >= self.seen_interval:
+                record.last_report = now
+                events.append(TagEvent(SEEN, uid, record.rssi, now))
+        # Oldest sightings first: stop at the first tag still present
+        while tags:
+            uid, record = next(iter(tags.items()))
+            if now - record.last_seen <= self.absence_timeout and len(tags) <= self.max_tags:
+                break
+            del tags[uid]
+            events.append(TagEvent(DEPARTED, uid, record.rssi, now))
+        self.scans += 1
+        return events
+
+    def events(self, duration=None):
+        """ Scan until stop() or for duration seconds, yield the events """
+        self.running = True
+        end = None if duration is None else time.monotonic() + duration
+        while self.running:
+            for event in self.update(self.scan()):
+                yield event
+            if end is not None and time.monotonic() >= end:
+                break
+        self.running = False
+
+    def run(self, callback, duration=None):
+        """ Same as events() but call callback(event) for each of them """
+        for event in self.events(duration):
+            callback(event)
+
+    def stop(self):
+        self.running = False
+
+    def clear(self):
+        """ Forget every tag, return their DEPARTED events """
+        now = time.monotonic()
+        events = [TagEvent(DEPARTED, uid, record.rssi, now)
+                  for uid, record in self.tags.items()]
+        self.tags.clear()
+        return events
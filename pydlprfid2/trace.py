@@ -0,0 +1,149 @@
+# -*- coding: utf-8; tab-width: 4; indent-tabs-mode: nil; c-basic-offset: 4 -*-
+# vim:fenc=utf-8:et:sw=4:ts=4:sts=4:tw=0
+#
+# Wire-level trace recorder and replay transport
+#
+# A trace file is the magic b'DLPTRACE', a version byte, then one record per
+# frame sent or reply received: direction (1 byte), nanoseconds since the
+# start of the trace (8 bytes), length (4 bytes), all little endian, then
+# the raw bytes.
+#
+#   reader.start_trace('session.trace')
+#   ...
+#   reader.stop_trace()
+#
+#   reader = PyDlpRfid2(None, transport=ReplaySerial('session.trace'))
+
+import time
+import struct
+import collections
+
+MAGIC = b'DLPTRACE'
+VERSION = 1
+SEND = 0
+RECV = 1
+
+RECORD = struct.Struct('<BQI')
+
+
+class TraceRecorder(object):
+
+    def __init__(self, path):
+        self.fileobj = open(path, 'wb')
+        self.fileobj.write(MAGIC + bytes([VERSION]))
+        self.start = time.monotonic_ns()
+        self.records = 0
+
+    def record(self, direction, data):
+        self.fileobj.write(RECORD.pack(direction, time.monotonic_ns() - self.start, len(data)))
+        self.fileobj.write(data)
+        self.records += 1
+
+    def close(self):
+        self.fileobj.close()
+
+
+def read_trace(path):
+    """ Yield the (direction, timestamp in seconds, data) records of a trace """
+    with open(path, 'rb') as fileobj:
+        header = fileobj.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC):] != bytes([VERSION]):
+            raise ValueError("{} is not a trace file".format(path))
+        while True:
+            head = fileobj.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            direction, timestamp, length = RECORD.unpack(head)
+            yield direction, timestamp / 1e9, fileobj.read(length)
+
+
+class ReplaySerial(object):
+    """ Serial port stand-in playing a trace back
+
+    Each reply recorded is delivered once the frames recorded before it
+    have been written. With realtime, it comes after the delay recorded,
+    otherwise at once. With strict, written bytes differing from the
+    trace raise ValueError.
+    """
+
+    def __init__(self, path, realtime=False, strict=True, timeout=0.02):
+        self.portstr = path
+        self.realtime = realtime
+        self.strict = strict
+        self.timeout = timeout
+        self.records = collections.deque(read_trace(path))
+        self.expected = b''
+        self.sent_at = 0.0
+        self.rx = bytearray()
+        self.pending = collections.deque()  # (available at, data)
+        self.is_open = True
+
+    def _poll(self):
+        now = time.monotonic()
+        while self.pending and self.pending[0][0] <= now:
+            self.rx += self.pending.popleft()[1]
+
+    def _next_frame(self):
+        # Replies recorded before any frame come at once
+        while self.records and self.records[0][0] == RECV:
+            self.pending.append((0.0, self.records.popleft()[2]))
+        if not self.records:
+            return False
+        direction, self.sent_at, self.expected = self.records.popleft()
+        return True
+
+    def _queue_replies(self):
+        now = time.monotonic()
+        while self.records and self.records[0][0] == RECV:
+            direction, timestamp, data = self.records.popleft()
+            delay = timestamp - self.sent_at if self.realtime else 0.0
+            self.pending.append((now + delay, data))
+
+    def write(self, data):
+        data = bytes(data)
+        size = len(data)
+        while data:
+            if not self.expected and not self._next_frame():
+                if self.strict:
+                    raise ValueError("Write past the end of the trace")
+                return size
+            count = min(len(data), len(self.expected))
+            if self.strict and data[:count] != self.expected[:count]:
+                raise ValueError("Trace mismatch: wrote {!r}, expected {!r}".format(
+                    data[:count], self.expected[:count]))
+            data = data[count:]
+            self.expected = self.expected[count:]
+            if not self.expected:
+                self._queue_replies()
+        return size
+
+    @property
+    def in_waiting(self):
+        self._poll()
+        return len(self.rx)
+
+    def read(self, size=1):
+        self._poll()
+        if not self.rx:
+            deadline = time.monotonic() + (self.timeout or 0)
+            while not self.rx and time.monotonic() < deadline:
+                if self.pending:
+                    time.sleep(max(0.0, min(self.pending[0][0], deadline) - time.monotonic()))
+                else:
+                    time.sleep(max(0.0, deadline - time.monotonic()))
+                self._poll()
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def readall(self):
+        self._poll()
+        data = bytes(self.rx)
+        self.rx.clear()
+        return data
+
+    def reset_input_buffer(self):
+        self.readall()
+
+    def close(self):
+        self.is_open = False
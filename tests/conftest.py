@@ -0,0 +1,29 @@
+import logging
+
+import pytest
+
+from pydlprfid2.emulator import Emulator, M24LR64ER
+from pydlprfid2.pydlprfid2 import PyDlpRfid2
+
+UID = "E002223344556677"
+
+
+@pytest.fixture
+def tag():
+    return M24LR64ER(UID)
+
+
+@pytest.fixture
+def emulator(tag):
+    # DLP-RFID2 on a pseudo-terminal with tag in its field
+    with Emulator([tag], seed=0) as emu:
+        yield emu
+
+
+@pytest.fixture
+def reader(emulator):
+    # Reader on the emulator, configured for ISO15693
+    reader = PyDlpRfid2(emulator.port, loglevel=logging.WARNING)
+    reader.set_protocol()
+    yield reader
+    reader.close()
@@ -0,0 +1,92 @@
+import os
+import asyncio
+import logging
+
+import pytest
+
+from pydlprfid2.aio import AsyncPyDlpRfid2
+from pydlprfid2.emulator import DROP
+from pydlprfid2.pydlprfid2 import (NoResponseError, ReaderTimeoutError, TagError, NTAG5_CMD,
+                                   flagsbyte, uid_bytes)
+
+from conftest import UID
+
+
+def run(emulator, session):
+    # Run session(reader) on a reader of the emulator
+    async def main():
+        async with AsyncPyDlpRfid2(emulator.port, loglevel=logging.WARNING) as reader:
+            await reader.set_protocol()
+            return await session(reader)
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def tag(tag):
+    tag.memory[:256] = os.urandom(256)
+    return tag
+
+
+def block(tag, offset):
+    return tag.memory[offset*4:offset*4 + 4].hex().upper()
+
+
+def test_read(emulator, tag):
+    async def session(reader):
+        return (await reader.inventory(single_slot=True),
+                await reader.eeprom_read_single_block(UID, 3),
+                await reader.eeprom_read_multiple_block(UID, 4, 0),
+                await reader.eeprom_get_system_info(UID))
+    inventory, single, multiple, info = run(emulator, session)
+    assert inventory == (tag.uid, '%02X' % tag.rssi)
+    assert single == block(tag, 3)
+    assert multiple == ''.join(block(tag, i) for i in range(4))
+    assert info.startswith('00')
+
+
+def test_write(emulator, tag):
+    async def session(reader):
+        resp = await reader.eeprom_write_single_block(UID, 2, 'CAFEBABE')
+        resps = await reader.eeprom_write_multiple_block(UID, 3, [0x01234567])
+        return resp, resps
+    assert run(emulator, session) == ('00', ['00'])
+    assert tag.memory[8:16] == bytes.fromhex('CAFEBABE01234567')
+
+
+def test_classified_errors(emulator):
+    async def session(reader):
+        emulator.inject(DROP)
+        assert await reader.eeprom_read_single_block(UID, 0) is None
+        emulator.inject(DROP)
+        with pytest.raises(NoResponseError):
+            await reader.tag_command(flagsbyte(address=True, protocol_extension=True),
+                                     NTAG5_CMD["READ_SINGLE_BLOCK"]["code"],
+                                     uid_bytes(UID) + b'\x00\x00')
+        with pytest.raises(TagError) as excinfo:
+            await reader.eeprom_read_multiple_block(UID, 4, 2048)
+        return excinfo.value.code
+    assert run(emulator, session) == 0x10
+
+
+def test_cancel(emulator, tag):
+    async def session(reader):
+        emulator.command_latency['18'] = 0.2
+        task = asyncio.ensure_future(reader.eeprom_read_single_block(UID, 1))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        del emulator.command_latency['18']
+        # The late reply to block 1 is not taken for the one to block 2
+        return await reader.eeprom_read_single_block(UID, 2)
+    assert run(emulator, session) == block(tag, 2)
+
+
+def test_timeout(emulator, tag):
+    async def session(reader):
+        emulator.command_latency['18'] = 0.2
+        with pytest.raises(ReaderTimeoutError):
+            await reader.eeprom_read_single_block(UID, 1, timeout=0.05)
+        del emulator.command_latency['18']
+        return await reader.eeprom_read_single_block(UID, 2, timeout=0.5)
+    assert run(emulator, session) == block(tag, 2)
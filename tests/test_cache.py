@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from pydlprfid2.cache import BlockCache
+
+from conftest import UID
+
+
+@pytest.fixture
+def tag(tag):
+    tag.memory[:256] = os.urandom(256)
+    return tag
+
+
+def block(tag, offset):
+    return tag.memory[offset*4:offset*4 + 4].hex().upper()
+
+
+def test_read_through(reader, tag, emulator):
+    cache = BlockCache(reader, prefetch=8)
+    requests = emulator.commands['18']
+    values = [cache.read_single_block(UID, offset) for offset in range(10)]
+    assert values == [block(tag, offset) for offset in range(10)]
+    # 0 alone, then 1 to 8 and 9 to 16 prefetched 8 blocks a request
+    assert emulator.commands['18'] - requests == 3
+    assert cache.stats['prefetched'] == 14
+    assert cache.read_multiple_block(UID, 4, 3) == ''.join(block(tag, i) for i in range(3, 7))
+    assert emulator.commands['18'] - requests == 3
+
+
+def test_partial_range_evicted(reader, tag):
+    cache = BlockCache(reader, max_blocks=4, prefetch=1)
+    for offset in (0, 10, 11, 12):
+        cache.read_single_block(UID, offset)
+    # Block 0 is a hit, the least recently used, fetching 1 to 3 evicts it
+    assert cache.read_multiple_block(UID, 4, 0) == ''.join(block(tag, i) for i in range(4))
+    assert cache.stats['blocks'] == 4
+
+
+def test_write_back_flush(reader, tag):
+    cache = BlockCache(reader, write_back=True)
+    original = block(tag, 5)
+    cache.write_single_block(UID, 5, 'CAFEBABE')
+    assert block(tag, 5) == original
+    assert cache.read_single_block(UID, 5) == 'CAFEBABE'
+    # A fetch over the buffered block keeps the write
+    assert cache.read_multiple_block(UID, 8, 0)[40:48] == 'CAFEBABE'
+    assert cache.stats['dirty'] == 1
+    cache.flush(UID)
+    assert block(tag, 5) == 'CAFEBABE'
+    assert cache.stats['dirty'] == 0
+
+
+def test_evicted_write_written(reader, tag):
+    cache = BlockCache(reader, max_blocks=2, write_back=True)
+    cache.write_single_block(UID, 0, '01234567')
+    cache.read_single_block(UID, 20)
+    assert block(tag, 0) != '01234567'
+    cache.read_single_block(UID, 30)
+    assert block(tag, 0) == '01234567'
+    assert cache.stats == {'hits': 0, 'misses': 2, 'prefetched': 0, 'blocks': 2, 'dirty': 0}
+
+
+def test_invalidate_drops_writes(reader, tag):
+    cache = BlockCache(reader, write_back=True)
+    original = block(tag, 1)
+    cache.write_single_block(UID, 1, '89ABCDEF')
+    cache.invalidate(UID)
+    cache.flush()
+    assert block(tag, 1) == original
+    assert cache.read_single_block(UID, 1) == original
@@ -0,0 +1,36 @@
+from pydlprfid2.crc import CRC, crc16, crc16_batch
+
+MODEL = b'RFID tag data model'
+
+
+def test_reference_value():
+    assert crc16(MODEL) == 0x1AEE
+    assert CRC().calculate([c for c in MODEL]) == ['1A', 'EE']
+
+
+def test_calculate_zero_padded():
+    # CRC 0x0DD9, it was split as ['DD', '9']
+    assert crc16(b'11') == 0x0DD9
+    assert CRC().calculate(b'11') == ['0D', 'D9']
+
+
+def test_streaming():
+    crc = CRC()
+    for i in range(0, len(MODEL), 3):
+        crc.update(memoryview(MODEL)[i:i + 3])
+    assert crc.value == crc16(MODEL)
+    assert crc16(MODEL[7:], crc16(MODEL[:7])) == crc16(MODEL)
+    crc.reset()
+    assert crc.update(bytearray(MODEL)).value == 0x1AEE
+
+
+def test_update_crc():
+    crc = CRC()
+    for c in MODEL:
+        crc.update_crc(c)
+    assert crc.crc_sum == 0x1AEE
+
+
+def test_batch():
+    images = [MODEL, b'11', b'']
+    assert crc16_batch(images) == [crc16(image) for image in images]
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from pydlprfid2 import main
+from pydlprfid2.daemon import ReaderDaemon, DaemonClient, RemoteError
+from pydlprfid2.pydlprfid2 import StandardError
+
+from conftest import UID
+
+
+@pytest.fixture
+def daemon(reader, tmp_path):
+    server = ReaderDaemon(reader, str(tmp_path / "pdr2.sock"))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01})
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_round_trip(daemon, tag):
+    with DaemonClient(daemon.path) as client:
+        assert client.call("ping") is True
+        report = client.inventory_all()
+        assert report.tags == [(tag.uid, '%02X' % tag.rssi)]
+        client.eeprom_write_single_block(UID, 3, 'DEADBEEF')
+        assert client.eeprom_read_single_block(UID, 3) == 'DEADBEEF'
+        client.eeprom_write_multiple_block(UID, 4, [0x01234567, 0x89ABCDEF])
+        assert client.eeprom_read_multiple_block(UID, 2, 4) == '0123456789ABCDEF'
+        delta = client.eeprom_write_delta(UID, 4, [0x01234567, 0x11111111])
+        assert delta.written == [5] and delta.ranges == [(5, 1)]
+    assert tag.memory[12:24] == bytes.fromhex('DEADBEEF' '01234567' '11111111')
+    assert daemon.requests == 7
+
+
+def test_clients_share_the_reader(daemon):
+    with DaemonClient(daemon.path) as first, DaemonClient(daemon.path) as second:
+        first.eeprom_write_single_block(UID, 0, '00C0FFEE')
+        assert second.eeprom_read_single_block(UID, 0) == '00C0FFEE'
+
+
+def test_remote_errors(daemon):
+    with DaemonClient(daemon.path) as client:
+        with pytest.raises(RemoteError) as excinfo:
+            client.eeprom_read_multiple_block(UID, 1, 4096)
+        assert excinfo.value.name == "TagError"
+        assert excinfo.value.code == 0x10
+        assert not excinfo.value.retryable
+        with pytest.raises(RemoteError) as excinfo:
+            client.call("format")
+        assert excinfo.value.name == "ValueError"
+
+
+def test_one_daemon_per_socket(daemon, reader):
+    with pytest.raises(StandardError):
+        ReaderDaemon(reader, daemon.path)
+
+
+def test_command_line_client(daemon, capsys):
+    main(["-S", daemon.path, "-l"])
+    assert "UID: {}".format(UID) in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("option", [["-v"], ["-i"], ["-p", "ISO14443A"], ["--trace=pdr2.trace"]])
+def test_reader_options_rejected(daemon, capsys, option):
+    # They would set up the reader of the daemon, not be ignored
+    with pytest.raises(SystemExit) as excinfo:
+        main(["-S", daemon.path, "-l"] + option)
+    assert excinfo.value.code == 2
+    assert "need a devtty" in capsys.readouterr().out
+    assert daemon.requests == 0
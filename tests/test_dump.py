@@ -0,0 +1,70 @@
+import io
+import os
+
+import pytest
+
+from pydlprfid2.emulator import M24LR64ER, DROP, COLLISION
+from pydlprfid2.pydlprfid2 import NoResponseError, TagError, VERIFY_DEFERRED
+
+from conftest import UID
+
+
+class ShortTag(M24LR64ER):
+    """ Tag answering at most 8 blocks to a READ_MULTIPLE_BLOCK """
+
+    def answer(self, flags, code, prms):
+        if code == 0x23 and prms[2] >= 8:
+            prms = prms[:2] + b'\x07'
+        return super().answer(flags, code, prms)
+
+
+def test_dump(reader, tag, emulator):
+    tag.memory[:] = os.urandom(len(tag.memory))
+    requests = emulator.commands['18']
+    fileobj = io.BytesIO()
+    report = reader.eeprom_dump(UID, fileobj)
+    assert fileobj.getvalue() == tag.memory
+    assert report.size == 8192
+    # One READ_MULTIPLE_BLOCK per sector
+    assert emulator.commands['18'] - requests == 64
+
+
+def test_restore(reader, tag):
+    image = os.urandom(100 * 4)
+    report = reader.eeprom_restore(UID, io.BytesIO(image), 10, VERIFY_DEFERRED)
+    assert report.blocks == 100
+    assert tag.memory[40:440] == image
+
+
+def test_halved_then_grown_back(reader, tag, emulator):
+    tag.memory[:256] = os.urandom(256)
+    emulator.inject(COLLISION)
+    requests = emulator.commands['18']
+    chunks = [(offset, len(data)) for offset, data in reader.iter_blocks(UID, 64)]
+    # 32 blocks garbled, 16, 16 up to the sector end, then 32 again
+    assert chunks == [(0, 64), (16, 64), (32, 128)]
+    assert emulator.commands['18'] - requests == 4
+    assert reader.read_blocks(UID, 0, 64) == tag.memory[:256]
+
+
+@pytest.mark.parametrize("tag", [ShortTag(UID)])
+def test_short_answers(reader, tag):
+    tag.memory[:256] = os.urandom(256)
+    assert reader.read_blocks(UID, 0, 64) == tag.memory[:256]
+
+
+def test_no_answer_raised(reader, emulator):
+    emulator.inject(DROP)
+    requests = emulator.commands['18']
+    with pytest.raises(NoResponseError):
+        reader.read_blocks(UID, 0, 32)
+    assert emulator.commands['18'] - requests == 1
+
+
+def test_tag_error_raised(reader, emulator):
+    requests = emulator.commands['18']
+    with pytest.raises(TagError) as excinfo:
+        reader.read_blocks(UID, 2048, 4)
+    # Block not available past the end, not 'Can't read block'
+    assert excinfo.value.code == 0x10
+    assert emulator.commands['18'] - requests == 1
@@ -0,0 +1,25 @@
+import sys
+import subprocess
+
+# The slow imports, done when first needed. Eagerly imported, they made
+# import pydlprfid2 take about 190 ms.
+LAZY_MODULES = ("serial", "termcolor", "pprint", "pkg_resources", "importlib.metadata")
+
+
+def imported_modules(module):
+    # The LAZY_MODULES a fresh interpreter holds once module is imported
+    code = ("import sys, {}; "
+            "print(' '.join(m for m in {!r} if m in sys.modules))".format(module, LAZY_MODULES))
+    proc = subprocess.run([sys.executable, "-c", code],
+                          capture_output=True, text=True, check=True)
+    return proc.stdout.split()
+
+
+def test_lazy_imports():
+    assert imported_modules("pydlprfid2") == []
+
+
+def test_lazy_submodules():
+    # The emulator and the async reader open no serial port at import
+    assert imported_modules("pydlprfid2.emulator") == []
+    assert imported_modules("pydlprfid2.aio") == []
@@ -0,0 +1,61 @@
+import logging
+
+from pydlprfid2.emulator import Emulator, M24LR64ER, COLLISION
+from pydlprfid2.pydlprfid2 import PyDlpRfid2
+
+# The first two share their 4 lower uid bits, the next two their 8 lower
+# bits: they collide in the first round, then in the second one.
+UIDS = ["E002000000000013", "E002000000000023", "E002000000000145", "E002000000000245",
+        "E00200000000000A"]
+
+
+def open_reader(emu):
+    reader = PyDlpRfid2(emu.port, loglevel=logging.WARNING)
+    reader.set_protocol()
+    return reader
+
+
+def test_single_slot(reader, tag):
+    assert reader.inventory(single_slot=True) == (tag.uid, '%02X' % tag.rssi)
+
+
+def test_sixteen_slots(reader, tag):
+    slots = reader.inventory_iso15693_slots()
+    assert len(slots) == 16
+    assert slots[tag.uid_value & 0x0F] == '%s,%02X' % (tag.uid, tag.rssi)
+    assert reader.inventory() == (tag.uid, '%02X' % tag.rssi)
+
+
+def test_collisions_resolved():
+    with Emulator([M24LR64ER(uid) for uid in UIDS]) as emu:
+        reader = open_reader(emu)
+        try:
+            report = reader.inventory_all()
+        finally:
+            reader.close()
+    assert sorted(uid for uid, rssi in report) == sorted(UIDS)
+    # 1 round, 2 for the slots 3 and 5, 1 for the slot 4 of the uids ending by 45
+    assert report.rounds == 4
+    assert report.collisions == 3
+
+
+def test_garbled_slot_inventoried_again():
+    with Emulator([M24LR64ER(UIDS[0])]) as emu:
+        emu.inject(COLLISION)
+        reader = open_reader(emu)
+        try:
+            report = reader.inventory_all()
+        finally:
+            reader.close()
+    assert [uid for uid, rssi in report] == [UIDS[0]]
+    assert report.collisions == 1
+
+
+def test_empty_field():
+    with Emulator() as emu:
+        reader = open_reader(emu)
+        try:
+            assert reader.inventory() is None
+            assert len(reader.inventory_all()) == 0
+        finally:
+            reader.close()
@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+
+import pytest
+
+from pydlprfid2.emulator import Emulator, Ntag5
+from pydlprfid2.ntag_interface import NtagInterface, SramChannel, StateScheduler
+from pydlprfid2.pydlprfid2 import StandardError
+
+NTAG_UID = "E004010000000001"
+
+
+@pytest.fixture
+def tag():
+    return Ntag5(NTAG_UID)
+
+
+@pytest.fixture
+def ntag(emulator):
+    ntag = NtagInterface(serial_port=emulator.port)
+    ntag.set_protocol()
+    yield ntag
+    ntag.close()
+
+
+def mcu_receive(tag, received):
+    # MCU side of SramChannel.send(): collect the fragments of a message
+    message = b''
+    while True:
+        sram = tag.mcu_read_sram()
+        if sram is None:
+            time.sleep(0.001)
+            continue
+        length, flags = sram[0], sram[1]
+        message += sram[4:4 + length]
+        if not flags & SramChannel.SRAM_MORE:
+            received.append(message)
+            return
+
+
+def mcu_send(tag, data):
+    # MCU side of SramChannel.receive(): write data by fragments
+    tag.set_direction(False)
+    size = SramChannel.FRAGMENT_SIZE
+    for sequence, offset in enumerate(range(0, max(len(data), 1), size)):
+        fragment = data[offset:offset + size]
+        flags = SramChannel.SRAM_MORE if offset + size < len(data) else 0
+        while tag.register(tag.SRAM_DATA_RDY):
+            time.sleep(0.001)
+        tag.mcu_write_sram(bytes((len(fragment), flags, sequence, 0)) + fragment)
+
+
+def in_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("size", [0, 10, 252, 253, 2000])
+def test_sram_channel(ntag, tag, size):
+    data = os.urandom(size)
+    channel = SramChannel(ntag, timeout=2.0)
+    tag.set_direction(True)
+    received = []
+    thread = in_thread(mcu_receive, tag, received)
+    assert channel.send(data) == size
+    thread.join()
+    assert received == [data]
+    thread = in_thread(mcu_send, tag, data)
+    assert channel.receive() == data
+    thread.join()
+
+
+def test_sram_channel_timeout(ntag):
+    with pytest.raises(StandardError):
+        SramChannel(ntag, timeout=0.1).receive()
+
+
+def test_read_sram(ntag, tag):
+    tag.set_direction(False)
+    tag.mcu_write_sram(bytes((11, 0, 0, 0)) + b'hello world')
+    assert ntag.read_sram() == b'hello world'
+    # Reading the last block handed the SRAM back
+    assert not tag.register(tag.SRAM_DATA_RDY)
+
+
+def test_read_sram_too_long(ntag, tag):
+    tag.set_direction(False)
+    tag.mcu_write_sram(bytes((253, 0, 0, 0)) + bytes(252))
+    with pytest.raises(StandardError):
+        ntag.read_sram()
+    assert not tag.register(tag.SRAM_DATA_RDY)
+
+
+def test_state_scheduler(emulator, tag, capsys):
+    ntag = NtagInterface(serial_port=emulator.port)
+    transitions = []
+    scheduler = StateScheduler(ntag, max_interval=0.01,
+                               on_transition=lambda old, new: transitions.append(new))
+    try:
+        tag.set_direction(False)
+        tag.mcu_write_sram(bytes((5, 0, 0, 0)) + b'hello')
+        assert scheduler.run() == 0
+    finally:
+        ntag.close()
+    # finish() stops the scheduler before the last transition
+    assert transitions == ["state_i2c_nfc_direction"]
+    assert "hello" in capsys.readouterr().out
+
+
+def test_state_scheduler_deadline(emulator, tag):
+    ntag = NtagInterface(serial_port=emulator.port)
+    timeouts = []
+    def on_timeout(state):
+        timeouts.append(state)
+    scheduler = StateScheduler(ntag, max_interval=0.01, on_timeout=on_timeout,
+                               deadlines={"state_i2c_nfc_direction": 0.1})
+    try:
+        # The MCU never writes the SRAM
+        tag.set_direction(False)
+        assert scheduler.run() == 1
+    finally:
+        ntag.close()
+    assert timeouts == ["state_i2c_nfc_direction"]
@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+
+from pydlprfid2.emulator import M24LR64ER
+from pydlprfid2.pydlprfid2 import (ReaderTimeoutError, NTAG5_CMD, flagsbyte, parse_tag_answer)
+
+from conftest import UID
+
+FLAGS = flagsbyte(protocol_extension=True)
+READ = NTAG5_CMD["READ_SINGLE_BLOCK"]["code"]
+
+
+class SlowTag(M24LR64ER):
+    """ Tag answering late to the read of block 3 """
+
+    def answer(self, flags, code, prms):
+        if code == READ and prms[:2] == b'\x03\x00':
+            time.sleep(0.3)
+        return super().answer(flags, code, prms)
+
+
+def submit_reads(pipe, blocks):
+    return [pipe.submit_request(FLAGS, READ, block.to_bytes(2, 'little')) for block in blocks]
+
+
+def test_in_order(reader, tag):
+    tag.memory[:256] = os.urandom(256)
+    with reader.pipeline(depth=8) as pipe:
+        futures = submit_reads(pipe, range(64))
+    assert [bytes(parse_tag_answer(f.result()).payload) for f in futures] == \
+        [tag.memory[i*4:i*4 + 4] for i in range(64)]
+    # A write for the first 8 frames, then one per 4 answers
+    assert pipe.writes == 15
+    assert pipe.completed == 64
+
+
+@pytest.mark.parametrize("tag", [SlowTag(UID)])
+def test_timeout_fails_inflight(reader, tag):
+    reader.READ_TIMEOUT = 0.1
+    pipe = reader.pipeline(depth=4)
+    futures = submit_reads(pipe, range(24))
+    pipe.flush()
+    with pytest.raises(ReaderTimeoutError):
+        futures[3].result()
+    # The frames in flight fail with it, none gets a stale reply
+    for block, future in enumerate(futures):
+        if future.exception() is None:
+            assert bytes(parse_tag_answer(future.result()).payload) == \
+                tag.memory[block*4:block*4 + 4]
+        else:
+            assert block >= 3
+            assert isinstance(future.exception(), ReaderTimeoutError)
+    # Once the tag is done, the next frames are answered
+    assert all(future.exception() is None for future in futures[:3] + futures[-8:])
@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+
+from pydlprfid2.emulator import Emulator, M24LR64ER
+from pydlprfid2.pool import ReaderPool
+from pydlprfid2.pydlprfid2 import PyDlpRfid2, StandardError
+
+from conftest import UID
+
+OTHER = "E002223344556688"
+
+
+@pytest.fixture
+def emulators(tag):
+    # Two readers, tag in both fields, another tag in the second one
+    with Emulator([tag], seed=0) as first, \
+            Emulator([M24LR64ER(UID), M24LR64ER(OTHER)], seed=1) as second:
+        yield first, second
+
+
+class BrokenAntenna(PyDlpRfid2):
+    """ Reader failing to switch its antenna """
+
+    closed = 0
+
+    def enable_external_antenna(self):
+        raise StandardError("No antenna")
+
+    def close(self):
+        BrokenAntenna.closed += 1
+        super().close()
+
+
+def test_merged_inventory(emulators):
+    ports = [emu.port for emu in emulators]
+    with ReaderPool(ports, loglevel=logging.WARNING) as pool:
+        tags = pool.merged_inventory()
+    assert sorted(tags) == [UID, OTHER]
+    assert sorted(port for port, rssi, latency in tags[UID]) == sorted(ports)
+    assert [port for port, rssi, latency in tags[OTHER]] == [ports[1]]
+    assert all(latency > 0 for port, rssi, latency in tags[UID] + tags[OTHER])
+
+
+def test_read_from_any(emulators, tag):
+    tag.memory[:8] = bytes.fromhex('0123456789ABCDEF')
+    with ReaderPool([emulators[0].port], loglevel=logging.WARNING) as pool:
+        port, data, latency = pool.read_multiple_block(UID, 2, 0)
+    assert (port, data) == (emulators[0].port, '0123456789ABCDEF')
+
+
+def test_initialize_failure(emulators):
+    with pytest.raises(StandardError):
+        ReaderPool([emu.port for emu in emulators], loglevel=logging.WARNING,
+                   reader_class=BrokenAntenna)
+    assert BrokenAntenna.closed == 2
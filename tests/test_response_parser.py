@@ -0,0 +1,81 @@
+from pydlprfid2.emulator import Emulator, M24LR64ER
+from pydlprfid2.pydlprfid2 import (PyDlpRfid2, ResponseParser, DLP_CMD, NTAG5_CMD,
+                                   build_frame, build_request, flagsbyte, reply_end)
+
+from conftest import UID
+
+READ = build_request(flagsbyte(), NTAG5_CMD["READ_SINGLE_BLOCK"]["code"], b'\x00')
+WRITE_REGISTERS = build_frame(DLP_CMD["WRITESINGLE"]["code"], '00210100')
+
+
+def test_reply_end():
+    assert reply_end(READ) == (1, None)
+    assert reply_end(build_frame(DLP_CMD["ANTICOL15693"]["code"], '060100')) == (16, None)
+    assert reply_end(build_frame(DLP_CMD["ANTICOL15693"]["code"], '260100')) == (1, None)
+    assert reply_end(build_frame(DLP_CMD["READSINGLE"]["code"], '0001')) == (2, None)
+    assert reply_end(WRITE_REGISTERS) == (None, 3)
+    assert reply_end(build_frame(DLP_CMD["EXTERNANT"]["code"])) == (None, 1)
+
+
+def test_payload_end():
+    parser = ResponseParser(1, echo=READ)
+    assert parser.feed(READ + b'\r\n\r\nRequest mode.\r\n') == b''
+    assert not parser.done
+    # The silence while the tag answers is no end
+    assert not parser.quiet_end
+    assert parser.feed(b'[0012345678]') == b''
+    assert not parser.done
+    assert parser.feed(b'\r\n' + READ) == READ
+    assert parser.done
+    assert bytes(parser.buf).endswith(b'[0012345678]\r\n')
+
+
+def test_line_end():
+    parser = ResponseParser(lines=3, echo=WRITE_REGISTERS)
+    parser.feed(WRITE_REGISTERS + b'\r\n\r\n')
+    assert not parser.done
+    assert parser.feed(b'Register write request.\r\n[]') == b'[]'
+    assert parser.done
+
+
+def test_stale_bytes_dropped():
+    # End of the reply to a command given up, then the echo split in two
+    parser = ResponseParser(1, echo=READ)
+    parser.feed(b'[00AABBCCDD]\r\n' + READ[:7])
+    assert not parser.done
+    parser.feed(READ[7:] + b'\r\n[0011223344]\r\n')
+    assert parser.done
+    assert parser.dropped == len(b'[00AABBCCDD]\r\n')
+    assert bytes(parser.buf) == READ + b'\r\n[0011223344]\r\n'
+
+
+def test_until_next_echo():
+    nxt = build_frame(DLP_CMD["VERSION"]["code"])
+    parser = ResponseParser(until=nxt)
+    assert parser.feed(b'0108000304F00000\r\n') == b''
+    assert parser.feed(nxt + b'\r\n') == nxt + b'\r\n'
+    assert parser.done
+
+
+def test_slow_tag_answer():
+    # The tag answers well after the quiet time following the echo
+    tag = M24LR64ER(UID)
+    tag.memory[0:4] = b'\x12\x34\x56\x78'
+    with Emulator([tag], rf_latency=5 * PyDlpRfid2.QUIET_TIME) as emu:
+        reader = PyDlpRfid2(emu.port)
+        try:
+            reader.set_protocol()
+            assert reader.eeprom_read_single_block(UID, 0) == '12345678'
+            assert reader.eeprom_read_single_block(UID, 1) == '00000000'
+        finally:
+            reader.close()
+
+
+def test_register_commands(reader, emulator):
+    reader.set_protocol(force=True)
+    assert emulator.registers[0] == 0x21
+    assert emulator.antenna is None
+    reader.enable_external_antenna()
+    # The antenna command only echoes, the next reply comes after it is done
+    assert reader.issue_evm_command(DLP_CMD["READSINGLE"]["code"], '0001') == ['21', '00']
+    assert emulator.antenna == DLP_CMD["EXTERNANT"]["code"]
@@ -0,0 +1,94 @@
+import logging
+
+import pytest
+
+from pydlprfid2.emulator import DROP, COLLISION, ERROR
+from pydlprfid2.pydlprfid2 import (PyDlpRfid2, NoResponseError, ReaderTimeoutError,
+                                   CollisionError, TagError, NTAG5_CMD, flagsbyte, uid_bytes,
+                                   parse_tag_answer)
+from pydlprfid2.retry import RetryPolicy
+
+from conftest import UID
+
+
+def read_block(reader, block):
+    # READ_SINGLE_BLOCK of UID, return the block bytes
+    resp = reader.tag_command(flagsbyte(address=True, protocol_extension=True),
+                              NTAG5_CMD["READ_SINGLE_BLOCK"]["code"],
+                              uid_bytes(UID) + block.to_bytes(2, 'little'))
+    return bytes(resp.payload)
+
+
+def test_classification(reader, emulator):
+    emulator.inject(DROP)
+    with pytest.raises(NoResponseError):
+        read_block(reader, 0)
+    emulator.inject(COLLISION)
+    with pytest.raises(CollisionError):
+        read_block(reader, 0)
+    emulator.inject(ERROR)
+    with pytest.raises(TagError) as excinfo:
+        read_block(reader, 0)
+    assert excinfo.value.code == 0x0F and excinfo.value.retryable
+
+
+def test_parse_tag_answer():
+    with pytest.raises(ReaderTimeoutError):
+        parse_tag_answer(b'', timed_out=True)
+    with pytest.raises(NoResponseError):
+        parse_tag_answer(b'\r\nRequest mode.\r\n[]\r\n')
+    with pytest.raises(TagError) as excinfo:
+        parse_tag_answer(b'[0110]\r\n')
+    assert excinfo.value.code == 0x10 and not excinfo.value.retryable
+    assert parse_tag_answer(b'[0012345678]\r\n').hex() == '0012345678'
+
+
+def test_transient_errors_retried(reader, emulator, tag):
+    tag.memory[0:4] = b'\xCA\xFE\xBA\xBE'
+    reader.retry_policy = RetryPolicy(max_attempts=4, base_delay=0.001)
+    emulator.inject(DROP)
+    emulator.inject(COLLISION)
+    emulator.inject(ERROR)
+    assert read_block(reader, 0) == b'\xCA\xFE\xBA\xBE'
+    assert reader.retry_policy.retries == 3
+    assert reader.retry_policy.failures == 0
+
+
+def test_final_errors_not_retried(reader):
+    reader.retry_policy = RetryPolicy(max_attempts=4, base_delay=0.001)
+    # Block not available
+    with pytest.raises(TagError) as excinfo:
+        read_block(reader, 4096)
+    assert excinfo.value.code == 0x10
+    assert reader.retry_policy.retries == 0
+    assert reader.retry_policy.failures == 1
+
+
+def test_retry_gives_up(reader, emulator):
+    reader.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.001)
+    emulator.inject(DROP, 2)
+    with pytest.raises(NoResponseError):
+        read_block(reader, 0)
+    assert reader.retry_policy.retries == 1
+
+
+def test_policy_per_reader(emulator):
+    readers = [PyDlpRfid2(emulator.port, loglevel=logging.WARNING) for i in range(2)]
+    try:
+        assert readers[0].retry_policy is not readers[1].retry_policy
+        assert readers[0].retry_policy.max_attempts == 1
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def test_budget():
+    policy = RetryPolicy(max_attempts=100, base_delay=0.01, jitter=0.0, budget=0.05)
+    calls = []
+    def fail():
+        calls.append(1)
+        raise NoResponseError("No tag answer")
+    with pytest.raises(NoResponseError):
+        policy.call(fail)
+    # 0.01 + 0.02 then 0.04 would exceed the budget
+    assert len(calls) == 3
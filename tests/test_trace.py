@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+
+from pydlprfid2.pydlprfid2 import PyDlpRfid2
+from pydlprfid2.trace import ReplaySerial, read_trace, SEND, RECV
+
+from conftest import UID
+
+
+def session(reader):
+    # The commands recorded then played back
+    reader.set_protocol()
+    reader.enable_external_antenna()
+    return (reader.inventory_all().tags,
+            reader.eeprom_read_multiple_block(UID, 4, 0),
+            reader.eeprom_write_single_block(UID, 1, '12345678'))
+
+
+def test_record_replay(emulator, tmp_path):
+    path = str(tmp_path / "session.trace")
+    reader = PyDlpRfid2(emulator.port, loglevel=logging.WARNING)
+    reader.start_trace(path)
+    try:
+        recorded = session(reader)
+    finally:
+        reader.close()
+    records = list(read_trace(path))
+    assert records[0][0] == SEND
+    assert {direction for direction, timestamp, data in records} == {SEND, RECV}
+    assert [timestamp for direction, timestamp, data in records] == \
+        sorted(timestamp for direction, timestamp, data in records)
+
+    replay = PyDlpRfid2(None, loglevel=logging.WARNING, transport=ReplaySerial(path))
+    try:
+        assert session(replay) == recorded
+    finally:
+        replay.close()
+
+
+def test_replay_mismatch(emulator, tmp_path):
+    path = str(tmp_path / "session.trace")
+    reader = PyDlpRfid2(emulator.port, loglevel=logging.WARNING)
+    reader.start_trace(path)
+    reader.set_protocol()
+    reader.close()
+    replay = PyDlpRfid2(None, loglevel=logging.WARNING, transport=ReplaySerial(path))
+    with pytest.raises(ValueError):
+        replay.enable_internal_antenna()
+
+
+def test_not_a_trace(tmp_path):
+    path = tmp_path / "session.trace"
+    path.write_bytes(b'0108000304FF0000')
+    with pytest.raises(ValueError):
+        list(read_trace(str(path)))
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from pydlprfid2.emulator import M24LR64ER
+from pydlprfid2.pydlprfid2 import (StandardError, VERIFY_BLOCK, VERIFY_DEFERRED, VERIFY_NONE,
+                                   VERIFY_POLICIES)
+
+from conftest import UID
+
+
+class StuckTag(M24LR64ER):
+    """ Tag acknowledging the writes of block 5 without programming it """
+
+    def answer(self, flags, code, prms):
+        if code == 0x21 and int.from_bytes(prms[:2], 'little') == 5:
+            return b'\x00'
+        return super().answer(flags, code, prms)
+
+
+@pytest.mark.parametrize("verify", VERIFY_POLICIES)
+def test_write_blocks(reader, tag, verify):
+    data = os.urandom(40 * 4)
+    report = reader.write_blocks(UID, 20, data, verify)
+    assert report.blocks == 40
+    assert tag.memory[20*4:60*4] == data
+    assert reader.read_blocks(UID, 20, 40) == data
+
+
+def test_write_multiple_block(reader, tag):
+    reader.eeprom_write_multiple_block(UID, 2, [0x01234567, 0x89ABCDEF], verify=VERIFY_DEFERRED)
+    assert reader.eeprom_read_multiple_block(UID, 2, 2) == '0123456789ABCDEF'
+
+
+@pytest.mark.parametrize("tag", [StuckTag(UID)])
+@pytest.mark.parametrize("verify", [VERIFY_BLOCK, VERIFY_DEFERRED])
+def test_verify_finds_block(reader, verify):
+    with pytest.raises(Exception, match="Write error on block 5: read 00000000 instead of 05060708"):
+        reader.write_blocks(UID, 4, bytes(range(1, 9)), verify)
+
+
+@pytest.mark.parametrize("tag", [StuckTag(UID)])
+def test_verify_none(reader):
+    reader.write_blocks(UID, 4, bytes(range(1, 9)), VERIFY_NONE)
+
+
+def test_unknown_policy(reader):
+    with pytest.raises(StandardError):
+        reader.write_blocks(UID, 0, bytes(4), 'crc')
+
+
+def test_write_delta(reader, tag):
+    tag.memory[0:32] = bytes.fromhex('00000001' '00000002' '00000003' '00000004'
+                                     '00000005' '00000006' '00000007' '00000008')
+    report = reader.eeprom_write_delta(UID, 0, [1, 0x22, 0x33, 4, 5, 6, 0x77, 8])
+    assert report.written == [1, 2, 6]
+    assert report.skipped == [0, 3, 4, 5, 7]
+    assert report.ranges == [(1, 2), (6, 1)]
+    assert tag.memory[0:32] == bytes.fromhex('00000001' '00000022' '00000033' '00000004'
+                                             '00000005' '00000006' '00000077' '00000008')
+
+
+def test_write_delta_unchanged(reader, tag, emulator):
+    requests = emulator.commands['18']
+    report = reader.eeprom_write_delta(UID, 0, [0] * 8)
+    assert report.written == []
+    # One READ_MULTIPLE_BLOCK, no write
+    assert emulator.commands['18'] == requests + 1